@@ -2,15 +2,20 @@
 
 import os
 import json
-import torch
-import faiss
 import numpy as np
 import google.generativeai as genai
-from sentence_transformers import SentenceTransformer, CrossEncoder
-import re
 from dotenv import load_dotenv
 import sqlite3
 import datetime
+import logging
+
+from modules.knowledge_store import load_knowledge_entries
+from modules.inference_server import EMBEDDER_MODEL_NAME, RERANKER_MODEL_NAME, connect_remote_resources, RemoteLongTermMemory
+from modules.telemetry import get_logger, span
+from modules.long_term_memory import LongTermMemory, ensure_history_columns
+from modules.response_cleaner import clean_response_text
+
+logger = get_logger("ai_bot")
 
 # ==============================================================================
 # ส่วนที่ 1: โหลดทรัพยากรหลัก
@@ -19,16 +24,25 @@ print("==========================================================")
 print("⚙️ [1/5] กำลังเริ่มต้นการตั้งค่าและโหลดโมเดล...")
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"ใช้ Device (สำหรับ Embedding): {device.upper()}")
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET")
 
 # --- โหลดโมเดลและฐานข้อมูลความรู้ (Knowledge Base) ---
-print("⏳ [2/5] กำลังโหลดโมเดลและฐานข้อมูลความรู้ (หนังสือ)...")
-embedder = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2", device=device)
-reranker = CrossEncoder("jinaai/jina-reranker-v1-turbo-en", device=device, trust_remote_code=True)
-knowledge_index = faiss.read_index("./index/faiss.index")
-with open("./index/mapping.json", "r", encoding="utf-8") as f:
-    knowledge_entries = json.load(f)
+if INFERENCE_SOCKET:
+    # โหมด worker บาง: โมเดลและ index อยู่ใน inference sidecar (modules/inference_server.py) ตัวเดียว
+    print(f"⏳ [2/5] กำลังเชื่อมต่อ Inference Sidecar ที่ {INFERENCE_SOCKET}...")
+    embedder, reranker, knowledge_index, knowledge_entries, _sidecar_info = connect_remote_resources(INFERENCE_SOCKET)
+else:
+    import torch
+    import faiss
+    from sentence_transformers import SentenceTransformer, CrossEncoder
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"ใช้ Device (สำหรับ Embedding): {device.upper()}")
+    print("⏳ [2/5] กำลังโหลดโมเดลและฐานข้อมูลความรู้ (หนังสือ)...")
+    embedder = SentenceTransformer(EMBEDDER_MODEL_NAME, device=device)
+    reranker = CrossEncoder(RERANKER_MODEL_NAME, device=device, trust_remote_code=True)
+    knowledge_index = faiss.read_index("./index/faiss.index")
+    knowledge_entries = load_knowledge_entries("./index")
 
 # --- Cache โมเดล Gemini ---
 print("🔥 [3/5] กำลังเชื่อมต่อ Gemini...")
@@ -79,33 +93,83 @@ print("🧠 [5/5] กำลังโหลดความทรงจำระ
 def init_short_term_memory_db():
     conn = sqlite3.connect('data/memory.db')
     cursor = conn.cursor()
-    cursor.execute(''' CREATE TABLE IF NOT EXISTS conversation_history ( id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp DATETIME NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL ) ''')
+    cursor.execute(''' CREATE TABLE IF NOT EXISTS conversation_history ( id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp DATETIME NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, reply_to INTEGER, route TEXT ) ''')
     conn.commit()
+    ensure_history_columns(conn)
     conn.close()
     print("  - 🗄️  ฐานข้อมูลความจำระยะสั้น (memory.db) พร้อมใช้งาน")
 
-def add_to_short_term_memory(role, content):
-    conn = sqlite3.connect('data/memory.db')
-    cursor = conn.cursor()
-    timestamp = datetime.datetime.now()
-    try:
-        cursor.execute("INSERT INTO conversation_history (timestamp, role, content) VALUES (?, ?, ?)", (timestamp, role, content))
-        conn.commit()
-    except Exception as e:
-        print(f"❌ [ERROR] ไม่สามารถบันทึกความจำระยะสั้นได้: {e}")
-    finally:
-        conn.close()
+def add_to_short_term_memory(role, content, reply_to=None, route=None):
+    """
+    บันทึกข้อความลง memory.db และคืนค่า id ของแถวที่บันทึก (None ถ้าบันทึกไม่สำเร็จ)
+    reply_to คือ id ของข้อความ user ที่คำตอบนี้ตอบ (ใช้จับคู่ถาม-ตอบเมื่อมีหลายคำขอพร้อมกัน)
+    route คือเส้นทางที่ใช้ตอบ (ความทรงจำระยะยาวเก็บเฉพาะคำตอบจาก Super Advisor)
+    """
+    with span("memory_io"):
+        conn = sqlite3.connect('data/memory.db')
+        cursor = conn.cursor()
+        timestamp = datetime.datetime.now()
+        try:
+            cursor.execute(
+                "INSERT INTO conversation_history (timestamp, role, content, reply_to, route) VALUES (?, ?, ?, ?, ?)",
+                (timestamp, role, content, reply_to, route),
+            )
+            conn.commit()
+            return cursor.lastrowid
+        except Exception as e:
+            logger.error(f"❌ [ERROR] ไม่สามารถบันทึกความจำระยะสั้นได้: {e}")
+            return None
+        finally:
+            conn.close()
 
 def get_last_n_short_term_memories(n=15):
     try:
-        conn = sqlite3.connect('data/memory.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT role, content FROM conversation_history ORDER BY id DESC LIMIT ?", (n,))
-        history = cursor.fetchall()
-        conn.close()
+        with span("memory_io"):
+            conn = sqlite3.connect('data/memory.db')
+            cursor = conn.cursor()
+            cursor.execute("SELECT role, content FROM conversation_history ORDER BY id DESC LIMIT ?", (n,))
+            history = cursor.fetchall()
+            conn.close()
         return list(reversed(history))
     except Exception as e:
-        print(f"❌ [ERROR] ไม่สามารถดึงความจำระยะสั้นได้: {e}")
+        logger.error(f"❌ [ERROR] ไม่สามารถดึงความจำระยะสั้นได้: {e}")
+        return []
+
+def get_short_term_memories_after(after_id, limit=16):
+    """คืนค่า (id, role, content) ที่ id มากกว่า after_id เรียงจากเก่าไปใหม่ ไม่เกิน limit แถว (แถวที่ต่อจาก after_id)"""
+    try:
+        with span("memory_io"):
+            conn = sqlite3.connect('data/memory.db')
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, role, content FROM conversation_history WHERE id > ? ORDER BY id ASC LIMIT ?",
+                (after_id, limit),
+            )
+            rows = cursor.fetchall()
+            conn.close()
+        return rows
+    except Exception as e:
+        logger.error(f"❌ [ERROR] ไม่สามารถดึงความจำระยะสั้นได้: {e}")
+        return []
+
+def get_short_term_memories_before(before_id=None, limit=20):
+    """คืนค่า (id, role, content) ที่ id น้อยกว่า before_id (หรือล่าสุดถ้าไม่ระบุ) เรียงจากเก่าไปใหม่ ไม่เกิน limit แถว"""
+    try:
+        with span("memory_io"):
+            conn = sqlite3.connect('data/memory.db')
+            cursor = conn.cursor()
+            if before_id is None:
+                cursor.execute("SELECT id, role, content FROM conversation_history ORDER BY id DESC LIMIT ?", (limit,))
+            else:
+                cursor.execute(
+                    "SELECT id, role, content FROM conversation_history WHERE id < ? ORDER BY id DESC LIMIT ?",
+                    (before_id, limit),
+                )
+            rows = cursor.fetchall()
+            conn.close()
+        return list(reversed(rows))
+    except Exception as e:
+        logger.error(f"❌ [ERROR] ไม่สามารถดึงความจำระยะสั้นได้: {e}")
         return []
 
 THAI_HOLIDAYS = { "01-01": "วันขึ้นปีใหม่", "04-13": "วันสงกรานต์", "04-14": "วันสงกรานต์", "04-15": "วันสงกรานต์", "05-01": "วันแรงงานแห่งชาติ", "07-28": "วันเฉลิมพระชนมพรรษา รัชกาลที่ 10", "08-12": "วันแม่แห่งชาติ", "10-13": "วันคล้ายวันสวรรคต รัชกาลที่ 9", "10-23": "วันปิยมหาราช", "12-05": "วันพ่อแห่งชาติ", "12-10": "วันรัฐธรรมนูญ", "12-31": "วันสิ้นปี" }
@@ -140,27 +204,37 @@ def create_persona_block(profile: dict) -> str:
     return persona.strip()
 
 PERSONA_BLOCK = create_persona_block(FENG_PROFILE)
+# ความทรงจำระยะยาว (โหลดและ sync กับ memory.db ตอน startup ใน main.lifespan)
+# เมื่อใช้ sidecar index ความทรงจำระยะยาวอยู่ที่ sidecar ตัวเดียว (มีผู้เขียนไฟล์เพียง process เดียว)
+long_term_memory = RemoteLongTermMemory(embedder.client) if INFERENCE_SOCKET else LongTermMemory(embedder)
 GEMINI_CONFIG = {"temperature": 0.3, "top_p": 0.95, "top_k": 40}
-all_book_titles = sorted(list(set([entry.get("book_title", "").strip() for entry in knowledge_entries.values() if entry.get("book_title")])))
-all_categories = sorted(list(set([entry.get("category", "").strip() for entry in knowledge_entries.values() if entry.get("category")])))
+if INFERENCE_SOCKET:
+    all_book_titles, all_categories = _sidecar_info["book_titles"], _sidecar_info["categories"]
+else:
+    all_book_titles = sorted(list(set([entry.get("book_title", "").strip() for entry in knowledge_entries.values() if entry.get("book_title")])))
+    all_categories = sorted(list(set([entry.get("category", "").strip() for entry in knowledge_entries.values() if entry.get("category")])))
 print(f"📚 พบหนังสือ {len(all_book_titles)} เล่ม ใน {len(all_categories)} หมวดหมู่")
 print("🎉 All systems configured and loaded successfully!")
 print("==========================================================")
 
-def generate_context_with_sources_separated(relevant_keys, query, num_final_context=7, score_threshold=0.2):
-    if not relevant_keys: return "ไม่มีข้อมูลเฉพาะเจาะจง", []
-    candidate_data = [{'content': knowledge_entries.get(str(key), {}).get('embedding_text', '').strip(), 'source': knowledge_entries.get(str(key), {})} for key in relevant_keys]
-    candidate_data = [data for data in candidate_data if data['content']]
-    if not candidate_data: return "ไม่มีข้อมูลเฉพาะเจาะจง", []
-    sentence_pairs = [[query, data['content']] for data in candidate_data]
-    scores = reranker.predict(sentence_pairs)
+def _collect_candidates(relevant_keys):
+    if hasattr(knowledge_entries, "get_many"):
+        entries = [entry or {} for entry in knowledge_entries.get_many(relevant_keys)]
+    else:
+        entries = [knowledge_entries.get(str(key), {}) for key in relevant_keys]
+    candidate_data = [{'content': entry.get('embedding_text', '').strip(), 'source': entry} for entry in entries]
+    return [data for data in candidate_data if data['content']]
+
+def _select_context(candidate_data, scores, num_final_context, score_threshold):
     for i, score in enumerate(scores): candidate_data[i]['score'] = score
     ranked_results = sorted(candidate_data, key=lambda x: x['score'], reverse=True)
     context_parts, sources = [], []
-    print("\n📈 [DEBUG] Reranker Scores (Threshold = 0.2):")
+    debug_scores = logger.isEnabledFor(logging.DEBUG)
+    if debug_scores: logger.debug(f"📈 Reranker Scores (Threshold = {score_threshold}):")
     for result in ranked_results:
         score, content, source_info = result['score'], result['content'], result['source']
-        print(f"  Score: {score:.4f} | Book: {source_info.get('book_title', 'N/A')} | Text: {content[:60].replace(chr(10), ' ')}...")
+        if debug_scores:
+            logger.debug(f"  Score: {score:.4f} | Book: {source_info.get('book_title', 'N/A')} | Text: {content[:60].replace(chr(10), ' ')}...")
         if score >= score_threshold:
             context_parts.append(content)
             sources.append({"book_title": source_info.get("book_title", "ไม่ระบุ"), "title": source_info.get("title", "ไม่ระบุหัวข้อ")})
@@ -168,10 +242,37 @@ def generate_context_with_sources_separated(relevant_keys, query, num_final_cont
     if not context_parts: return "ไม่มีข้อมูลเฉพาะเจาะจง", []
     return "\n---\n".join(context_parts), sources
 
+def generate_context_with_sources_separated(relevant_keys, query, num_final_context=7, score_threshold=0.2):
+    if not relevant_keys: return "ไม่มีข้อมูลเฉพาะเจาะจง", []
+    candidate_data = _collect_candidates(relevant_keys)
+    if not candidate_data: return "ไม่มีข้อมูลเฉพาะเจาะจง", []
+    sentence_pairs = [[query, data['content']] for data in candidate_data]
+    with span("rerank"):
+        scores = reranker.predict(sentence_pairs)
+    return _select_context(candidate_data, scores, num_final_context, score_threshold)
+
+def generate_contexts_batch(relevant_keys_per_query, queries, num_final_context=7, score_threshold=0.2, batch_size=128):
+    """
+    เหมือน generate_context_with_sources_separated แต่ทำหลายคำถามพร้อมกัน
+    โดย rerank คู่ (คำถาม, ข้อความ) ของทุกคำถามในการเรียก reranker ครั้งเดียว
+    คืนค่า list ของ (context_from_books, sources) ตามลำดับของ queries
+    """
+    candidates_per_query = [_collect_candidates(keys) if keys else [] for keys in relevant_keys_per_query]
+    sentence_pairs = [[query, data['content']] for query, candidates in zip(queries, candidates_per_query) for data in candidates]
+    scores = []
+    if sentence_pairs:
+        with span("rerank_batch"):
+            scores = reranker.predict(sentence_pairs, batch_size=batch_size)
+
+    results, offset = [], 0
+    for candidates in candidates_per_query:
+        if not candidates:
+            results.append(("ไม่มีข้อมูลเฉพาะเจาะจง", []))
+            continue
+        results.append(_select_context(candidates, scores[offset:offset + len(candidates)], num_final_context, score_threshold))
+        offset += len(candidates)
+    return results
+
+@span("clean_response")
 def clean_response(response_text):
-    response_text = re.sub(r'\*\s*\*', '*', response_text)
-    response_text = re.sub(r'(^|\n)\s*\*\s*', r'\1  * ', response_text)
-    response_text = re.sub(r'\s*---\s*', '\n\n---\n\n', response_text)
-    response_text = re.sub(r'\n{3,}', '\n\n', response_text)
-    response_text = re.sub(r'<[^>]+>', '', response_text)
-    return response_text.strip()
\ No newline at end of file
+    return clean_response_text(response_text)
\ No newline at end of file
@@ -0,0 +1,9 @@
+# File: benchmarks/__init__.py
+#
+# ชุด benchmark สำหรับวัดผลการเปลี่ยนแปลงใน pipeline ของ /ask
+# - micro (micro.py): วัดฟังก์ชันใน hot path ทีละตัวบนคลังหนังสือภาษาไทยสังเคราะห์
+# - load (load.py): ยิงคำขอพร้อมกันหลายตัวไปที่ /ask โดยใช้ LLM จำลองและ Unsplash จำลอง
+# - eval (retrieval_eval.py): วัด recall/MRR/latency ของการค้นหาจริงด้วยชุดคำถามอ้างอิง และไล่หาค่าพารามิเตอร์ที่เหมาะสม
+#
+# วิธีใช้: python -m benchmarks micro|load [--save-baseline] [--compare]
+#          python -m benchmarks eval --golden benchmarks/golden_queries.jsonl
@@ -0,0 +1,60 @@
+# File: benchmarks/__main__.py
+
+import os
+import sys
+import argparse
+import tempfile
+
+from benchmarks import synthetic
+from benchmarks.stats import print_table, save_results, compare_with_baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark ของ pipeline /ask")
+    parser.add_argument("suite", choices=["micro", "load", "eval"])
+    parser.add_argument("--workspace", default=os.path.join(tempfile.gettempdir(), "consultant_bench"),
+                        help="โฟลเดอร์เก็บคลังหนังสือสังเคราะห์และ index (สร้างครั้งแรกแล้วใช้ซ้ำ)")
+    parser.add_argument("--entries", type=int, default=2000, help="จำนวนรายการในคลังหนังสือสังเคราะห์")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="เวลาหน่วง (วินาที) ของ LLM จำลอง")
+    parser.add_argument("--golden", default=os.path.join(os.path.dirname(__file__), "golden_queries.jsonl"),
+                        help="ชุดคำถามอ้างอิงสำหรับ eval (รันกับ index จริงในโฟลเดอร์ปัจจุบัน)")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[10, 20, 40])
+    parser.add_argument("--final", type=int, nargs="+", default=[3, 5, 7])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.0, 0.1, 0.2, 0.3])
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.suite == "eval":
+        from benchmarks.retrieval_eval import load_golden_queries, evaluate_retrieval, recommend_configuration, print_evaluation
+        try:
+            results = evaluate_retrieval(load_golden_queries(args.golden), args.top_k, args.final, args.thresholds)
+        except ValueError as e:
+            print(f"❌ {e}: '{args.golden}'")
+            sys.exit(1)
+        print_evaluation(results, recommend_configuration(results))
+        save_results(args.suite, results)
+        return
+
+    synthetic.build_workspace(args.workspace, args.entries)
+
+    if args.suite == "micro":
+        from benchmarks.micro import run_micro
+        results = run_micro(args.iterations)
+        print_table("Microbenchmarks", results)
+    else:
+        from benchmarks.load import run_load
+        results = run_load(args.requests, args.concurrency, args.llm_latency)
+        print_table(f"Load test /ask (concurrency={args.concurrency})", results)
+
+    save_results(args.suite, results, as_baseline=args.save_baseline)
+    if args.compare and not compare_with_baseline(args.suite, results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
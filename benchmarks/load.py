@@ -0,0 +1,97 @@
+# File: benchmarks/load.py
+
+import os
+import time
+import random
+import asyncio
+import threading
+
+import httpx
+import uvicorn
+
+from benchmarks import synthetic
+from benchmarks.stats import summarize
+from benchmarks.stubs import StubGeminiModel, MockUnsplashServer
+
+# สัดส่วนของคำถามแต่ละประเภทในการยิงโหลด (ใกล้เคียงการใช้งานจริง: ส่วนใหญ่เป็นคำถามปรึกษา)
+QUERY_MIX = {"super_advisor": 0.7, "quick_response": 0.15, "reporter": 0.1, "image_search": 0.05}
+
+
+def _build_requests(total, seed):
+    rng = random.Random(seed)
+    pools = {
+        "super_advisor": synthetic.generate_rag_queries(200, seed),
+        "quick_response": synthetic.QUICK_QUERIES,
+        "reporter": synthetic.REPORTER_QUERIES,
+        "image_search": synthetic.IMAGE_QUERIES,
+    }
+    kinds = rng.choices(list(QUERY_MIX), weights=list(QUERY_MIX.values()), k=total)
+    return [(kind, rng.choice(pools[kind])) for kind in kinds]
+
+
+class _ServerThread:
+    def __init__(self, app, port):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+async def _fire(base_url, requests_to_send, concurrency, timeout):
+    queue = asyncio.Queue()
+    for item in requests_to_send:
+        queue.put_nowait(item)
+    samples = {kind: [] for kind in QUERY_MIX}
+    errors = {"count": 0}
+
+    async def worker(client):
+        while not queue.empty():
+            kind, query = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{base_url}/ask", json={"query": query})
+                response.raise_for_status()
+                samples[kind].append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors["count"] += 1
+
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall_time = time.perf_counter() - start
+    return samples, errors["count"], wall_time
+
+
+def run_load(total_requests=300, concurrency=16, llm_latency=0.5, port=8765, seed=5, timeout=120):
+    """ยิงคำขอพร้อมกันไปที่ /ask ของแอปจริง โดยแทน Gemini และ Unsplash ด้วยตัวจำลอง"""
+    with MockUnsplashServer() as unsplash:
+        os.environ.setdefault("UNSPLASH_ACCESS_KEY", "benchmark")
+        import main
+        import modules.image_search as image_search
+
+        image_search.UNSPLASH_ACCESS_KEY = image_search.UNSPLASH_ACCESS_KEY or "benchmark"
+        image_search.UNSPLASH_API_URL = unsplash.url
+        stub_llm = StubGeminiModel(latency=llm_latency)
+        main.GEMINI_MODEL = stub_llm
+
+        requests_to_send = _build_requests(total_requests, seed)
+        with _ServerThread(main.app, port):
+            samples, error_count, wall_time = asyncio.run(
+                _fire(f"http://127.0.0.1:{port}", requests_to_send, concurrency, timeout))
+
+    all_samples = [latency for kind_samples in samples.values() for latency in kind_samples]
+    results = {"ask_all": summarize(all_samples, wall_time)}
+    for kind, kind_samples in samples.items():
+        results[f"ask_{kind}"] = summarize(kind_samples, wall_time)
+    results["ask_all"]["errors"] = error_count
+    results["ask_all"]["llm_calls"] = stub_llm.calls
+    results["ask_all"]["concurrency"] = concurrency
+    return results
@@ -0,0 +1,57 @@
+# File: benchmarks/micro.py
+
+import random
+import asyncio
+
+from benchmarks import synthetic
+from benchmarks.stats import summarize, time_calls
+from benchmarks.stubs import SAMPLE_ANSWER
+
+
+def run_micro(iterations=200, seed=3):
+    """วัดฟังก์ชันใน hot path ทีละตัว (ต้องเรียก synthetic.build_workspace ก่อน)"""
+    import main
+    import ai_bot
+    from quick_responses import QUICK_RESPONSES
+    from modules.system_tools import handle_system_tool_query
+
+    rng = random.Random(seed)
+    rag_queries = synthetic.generate_rag_queries(iterations, seed)
+    short_queries = synthetic.QUICK_QUERIES + synthetic.REPORTER_QUERIES + synthetic.NO_TOOL_QUERIES
+    mixed = [rng.choice(short_queries) for _ in range(iterations)]
+    results = {}
+
+    results["get_quick_response_safely"] = summarize(time_calls(
+        main.get_quick_response_safely, [(q.lower(), QUICK_RESPONSES) for q in mixed]))
+
+    loop = asyncio.new_event_loop()
+    try:
+        results["handle_system_tool_query"] = summarize(time_calls(
+            lambda q: loop.run_until_complete(handle_system_tool_query(q)),
+            [(q,) for q in synthetic.NO_TOOL_QUERIES * (iterations // 3) + rag_queries]))
+    finally:
+        loop.close()
+
+    answers = [SAMPLE_ANSWER * rng.randint(1, 6) for _ in range(iterations)]
+    results["clean_response"] = summarize(time_calls(ai_bot.clean_response, [(a,) for a in answers]))
+
+    results["embedding"] = summarize(time_calls(
+        lambda q: ai_bot.embedder.encode(q, convert_to_numpy=True), [(q,) for q in rag_queries]))
+
+    embeddings = ai_bot.embedder.encode(rag_queries, convert_to_numpy=True).astype("float32")
+    results["faiss_search_k20"] = summarize(time_calls(
+        lambda e: ai_bot.knowledge_index.search(e.reshape(1, -1), 20), [(e,) for e in embeddings]))
+
+    _, indices = ai_bot.knowledge_index.search(embeddings, 20)
+    context_args = [([str(i) for i in row if i >= 0], q) for row, q in zip(indices, rag_queries)]
+    context_args = context_args[:max(10, iterations // 4)]
+    # CrossEncoder อย่างเดียว (ไม่รวมการดึง entry และจัดรูปแบบ context)
+    rerank_pairs = [
+        ([[q, ai_bot.knowledge_entries[key].get("embedding_text", "")] for key in keys],)
+        for keys, q in context_args
+    ]
+    results["cross_encoder_top20"] = summarize(time_calls(ai_bot.reranker.predict, rerank_pairs))
+    results["generate_context_top20"] = summarize(time_calls(
+        ai_bot.generate_context_with_sources_separated, context_args))
+
+    return results
@@ -0,0 +1,151 @@
+# File: benchmarks/retrieval_eval.py
+
+import json
+import time
+import itertools
+
+from benchmarks.stats import summarize
+
+
+def load_golden_queries(path):
+    """
+    อ่านชุดคำถามอ้างอิง (.jsonl) แต่ละบรรทัดมีรูปแบบ
+    {"query": "...", "relevant": [{"book_title": "...", "title": "..."}]}
+    ถ้าไม่ระบุ "title" จะถือว่าข้อมูลจากหนังสือเล่มนั้นส่วนใดก็ได้ถือว่าเกี่ยวข้อง
+    """
+    golden = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                golden.append(json.loads(line))
+    return golden
+
+
+def _matches(source, relevant):
+    if source.get("book_title", "").strip() != relevant.get("book_title", "").strip():
+        return False
+    return not relevant.get("title") or source.get("title", "").strip() == relevant["title"].strip()
+
+
+def _first_relevant_rank(sources, relevant_items):
+    for rank, source in enumerate(sources, 1):
+        if any(_matches(source, relevant) for relevant in relevant_items):
+            return rank
+    return None
+
+
+def _recall(sources, relevant_items):
+    found = sum(1 for relevant in relevant_items if any(_matches(source, relevant) for source in sources))
+    return found / len(relevant_items)
+
+
+def evaluate_retrieval(golden, top_k_values=(10, 20, 40), num_final_values=(3, 5, 7),
+                       threshold_values=(0.0, 0.1, 0.2, 0.3)):
+    """
+    รันชุดคำถามอ้างอิงผ่านเส้นทางค้นหาจริง (embedder → knowledge_index → reranker → การคัด context
+    แบบเดียวกับ generate_context_with_sources_separated) กับทุกค่าผสมของพารามิเตอร์
+    แล้วคืนค่า recall, MRR, ขนาด context และ latency ของแต่ละชุดค่า
+
+    แต่ละคำถามถูก embed ค้น FAISS และ rerank ครั้งเดียวที่ top_k สูงสุด แล้วใช้คะแนนชุดนั้นซ้ำกับทุกชุดค่า
+    (candidate ของ top_k ที่น้อยกว่าคือส่วนต้นของชุดเดียวกัน) latency ของแต่ละชุดค่าจึงเป็นค่าประมาณ:
+    embed + ค้น + เวลา rerank ตามสัดส่วนจำนวน candidate + คัด context
+    """
+    if not golden:
+        raise ValueError("ชุดคำถามอ้างอิงว่างเปล่า")
+
+    import ai_bot
+
+    configurations = list(itertools.product(top_k_values, num_final_values, threshold_values))
+    metrics = {config: {"latencies": [], "recalls": [], "candidate_recalls": [], "reciprocal_ranks": [],
+                        "passages": [], "context_chars": []} for config in configurations}
+    max_top_k = max(top_k_values)
+
+    for item in golden:
+        relevant_items = item["relevant"]
+        start = time.perf_counter()
+        embedding = ai_bot.embedder.encode(item["query"], convert_to_numpy=True).astype("float32")
+        _, indices = ai_bot.knowledge_index.search(embedding.reshape(1, -1), max_top_k)
+        search_time = time.perf_counter() - start
+        candidate_keys = [str(idx) for idx in indices[0] if 0 <= idx < len(ai_bot.knowledge_entries)]
+
+        start = time.perf_counter()
+        all_candidates = ai_bot._collect_candidates(candidate_keys) if candidate_keys else []
+        all_scores = ai_bot.reranker.predict([[item["query"], data["content"]] for data in all_candidates]) if all_candidates else []
+        rerank_time = time.perf_counter() - start
+
+        for top_k in top_k_values:
+            keys = candidate_keys[:top_k]
+            candidate_recall = _recall([ai_bot.knowledge_entries.get(key, {}) for key in keys], relevant_items)
+            num_candidates = len(ai_bot._collect_candidates(keys)) if keys else 0
+            candidates, scores = all_candidates[:num_candidates], all_scores[:num_candidates]
+            top_k_rerank_time = rerank_time * num_candidates / len(all_candidates) if all_candidates else 0.0
+
+            for num_final, threshold in itertools.product(num_final_values, threshold_values):
+                start = time.perf_counter()
+                if candidates:
+                    context, sources = ai_bot._select_context(candidates, scores, num_final, threshold)
+                else:
+                    context, sources = "", []
+                select_time = time.perf_counter() - start
+
+                m = metrics[(top_k, num_final, threshold)]
+                m["latencies"].append(search_time + top_k_rerank_time + select_time)
+                m["candidate_recalls"].append(candidate_recall)
+                m["recalls"].append(_recall(sources, relevant_items))
+                rank = _first_relevant_rank(sources, relevant_items)
+                m["reciprocal_ranks"].append(1 / rank if rank else 0.0)
+                m["passages"].append(len(sources))
+                m["context_chars"].append(len(context) if sources else 0)
+
+    count = len(golden)
+    results = {}
+    for (top_k, num_final, threshold), m in metrics.items():
+        results[f"k={top_k} final={num_final} thr={threshold}"] = {
+            "top_k": top_k,
+            "num_final_context": num_final,
+            "score_threshold": threshold,
+            "faiss_recall": round(sum(m["candidate_recalls"]) / count, 4),
+            "recall": round(sum(m["recalls"]) / count, 4),
+            "mrr": round(sum(m["reciprocal_ranks"]) / count, 4),
+            "avg_passages": round(sum(m["passages"]) / count, 2),
+            "avg_context_chars": round(sum(m["context_chars"]) / count, 1),
+            "latency": summarize(m["latencies"]),
+        }
+    return results
+
+
+def recommend_configuration(results, tolerance=0.02):
+    """
+    เลือกชุดค่าที่ถูกที่สุด (ใช้ k น้อย, context สั้น, latency ต่ำ) ในบรรดาชุดค่าที่ recall และ MRR
+    ห่างจากค่าที่ดีที่สุดไม่เกิน tolerance คืนค่า None ถ้าไม่มีชุดค่าใดหาข้อมูลที่เกี่ยวข้องเจอเลย
+    """
+    # ชุดค่าที่ไม่ส่ง context ออกมาเลยมี avg_context_chars = 0 และจะถูกเลือกเสมอถ้าไม่กรองออก
+    with_context = {name: r for name, r in results.items() if r["avg_passages"] > 0}
+    if not with_context:
+        return None
+    best_recall = max(r["recall"] for r in with_context.values())
+    if best_recall == 0:
+        return None
+    best_mrr = max(r["mrr"] for r in with_context.values())
+    grounded = {
+        name: r for name, r in with_context.items()
+        if r["recall"] >= best_recall - tolerance and r["mrr"] >= best_mrr - tolerance
+    }
+    return min(grounded, key=lambda name: (
+        grounded[name]["avg_context_chars"], grounded[name]["top_k"], grounded[name]["latency"]["p50_ms"]))
+
+
+def print_evaluation(results, recommended):
+    print(f"\n📊 Retrieval evaluation ({len(results)} configurations)")
+    print(f"  {'configuration':<28}{'faiss_R':>9}{'recall':>9}{'MRR':>8}{'passages':>10}{'chars':>9}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, r in sorted(results.items(), key=lambda kv: (-kv[1]["recall"], -kv[1]["mrr"], kv[1]["latency"]["p50_ms"])):
+        marker = "⭐" if name == recommended else "  "
+        print(f"{marker}{name:<28}{r['faiss_recall']:>9.3f}{r['recall']:>9.3f}{r['mrr']:>8.3f}"
+              f"{r['avg_passages']:>10.2f}{r['avg_context_chars']:>9.0f}"
+              f"{r['latency']['p50_ms']:>10.2f}{r['latency']['p95_ms']:>10.2f}")
+    if recommended is None:
+        print("\n⚠️ ไม่มีชุดค่าใดค้นเจอข้อมูลที่เกี่ยวข้อง (recall = 0 ทุกชุด): ตรวจสอบชุดคำถามอ้างอิงหรือ index ก่อนปรับค่า")
+        return
+    best = results[recommended]
+    print(f"\n⭐ แนะนำ: RAG_TOP_K={best['top_k']} RAG_NUM_FINAL_CONTEXT={best['num_final_context']} "
+          f"RAG_SCORE_THRESHOLD={best['score_threshold']}")
@@ -0,0 +1,101 @@
+# File: benchmarks/stats.py
+
+import os
+import json
+import time
+import platform
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def summarize(latencies, wall_time=None):
+    """สรุป latency (วินาที) เป็น p50/p95/p99 หน่วยมิลลิวินาที พร้อม throughput ต่อวินาที"""
+    samples = np.asarray(latencies, dtype="float64") * 1000
+    if not len(samples):
+        return {"count": 0}
+    total = wall_time if wall_time is not None else samples.sum() / 1000
+    return {
+        "count": int(len(samples)),
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "throughput_per_s": round(len(samples) / total, 2) if total else None,
+    }
+
+
+def time_calls(func, args_list, warmup=3):
+    """เรียก func กับ args แต่ละชุดและคืนค่า latency ของแต่ละครั้ง (ไม่นับรอบ warmup)"""
+    for args in args_list[:warmup]:
+        func(*args)
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def print_table(title, results):
+    print(f"\n📊 {title}")
+    print(f"  {'name':<28}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'ops/s':>11}")
+    for name, stats in results.items():
+        if not stats.get("count"):
+            print(f"  {name:<28}{0:>7}")
+            continue
+        print(f"  {name:<28}{stats['count']:>7}{stats['p50_ms']:>11.3f}{stats['p95_ms']:>11.3f}"
+              f"{stats['p99_ms']:>11.3f}{stats['throughput_per_s'] or 0:>11.1f}")
+
+
+def save_results(suite, results, as_baseline=False):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    record = {
+        "suite": suite,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    path = os.path.join(RESULTS_DIR, f"{suite}-latest.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 บันทึกผลไว้ที่ '{path}'")
+
+    if as_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline[suite] = record
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"💾 อัปเดต baseline ของ '{suite}' ใน '{BASELINE_PATH}'")
+
+
+def compare_with_baseline(suite, results, tolerance=0.10):
+    """
+    เทียบ p50/p95/p99 กับ baseline ที่บันทึกไว้ คืนค่า True ถ้าไม่มีตัวไหนช้าลงเกิน tolerance
+    """
+    if not os.path.exists(BASELINE_PATH):
+        print("⚠️ ยังไม่มี baseline ให้เทียบ (รันด้วย --save-baseline ก่อน)")
+        return True
+    with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+        baseline = json.load(f).get(suite, {}).get("results", {})
+
+    ok = True
+    print(f"\n🔍 เทียบกับ baseline (ยอมให้ช้าลงได้ไม่เกิน {tolerance:.0%})")
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base or not stats.get("count"):
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if not base.get(key):
+                continue
+            change = stats[key] / base[key] - 1
+            regressed = change > tolerance
+            ok = ok and not regressed
+            marker = "❌" if regressed else "✅"
+            print(f"  {marker} {name:<28}{key:<8}{base[key]:>10.3f} → {stats[key]:>10.3f} ({change:+.1%})")
+    return ok
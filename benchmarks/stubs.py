@@ -0,0 +1,76 @@
+# File: benchmarks/stubs.py
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_ANSWER = """**บทวิเคราะห์**
+
+* **ประเด็นที่ 1:** การตัดสินใจอย่างมีเหตุผลเริ่มจากการแยกสิ่งที่ควบคุมได้ออกจากสิ่งที่ควบคุมไม่ได้
+* **ประเด็นที่ 2:** ควรจัดลำดับความสำคัญก่อนลงมือ
+---
+**ทางเลือก**
+*   ทางเลือก A: ลงมือทันที <b>ข้อดี</b> รวดเร็ว
+*   ทางเลือก B: รอข้อมูลเพิ่ม
+
+
+**สรุป:** เลือกทางที่สอดคล้องกับเป้าหมายระยะยาวครับ"""
+
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubGeminiModel:
+    """แทน genai.GenerativeModel โดยหน่วงเวลาคงที่แล้วคืนคำตอบสำเร็จรูป"""
+
+    def __init__(self, latency=0.05, answer=SAMPLE_ANSWER):
+        self.latency = latency
+        self.answer = answer
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return _StubResponse(self.answer)
+
+
+class _UnsplashHandler(BaseHTTPRequestHandler):
+    payload = json.dumps({"results": [{
+        "urls": {"regular": "https://images.example.com/photo.jpg"},
+        "alt_description": "synthetic image",
+        "user": {"name": "Bench Photographer", "links": {"html": "https://example.com/@bench"}},
+    }]}).encode("utf-8")
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.payload)))
+        self.end_headers()
+        self.wfile.write(self.payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockUnsplashServer:
+    """เซิร์ฟเวอร์ HTTP ภายในเครื่องที่ตอบแบบเดียวกับ Unsplash search API"""
+
+    def __init__(self, latency=0.02):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _UnsplashHandler)
+        self.httpd.latency = latency
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/search/photos"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
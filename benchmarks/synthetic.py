@@ -0,0 +1,101 @@
+# File: benchmarks/synthetic.py
+
+import os
+import sys
+import json
+import random
+import importlib
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_INFO_FILE = "bench_corpus.json"
+
+_BOOKS = {
+    "จิตวิทยา": ["พลังแห่งนิสัย", "คิดเร็วและช้า", "จิตใต้สำนึก"],
+    "ปรัชญา": ["สโตอิกในชีวิตประจำวัน", "ศิลปะแห่งการใช้ชีวิต", "เต๋าแห่งความเรียบง่าย"],
+    "ธุรกิจ": ["กลยุทธ์การแข่งขัน", "ผู้นำที่ยิ่งใหญ่", "การตัดสินใจภายใต้ความไม่แน่นอน"],
+    "พัฒนาตนเอง": ["วินัยสร้างชีวิต", "การบริหารเวลา", "ความล้มเหลวคือครู"],
+}
+_SUBJECTS = ["ผู้นำ", "คนทำงาน", "นักเรียน", "ผู้ประกอบการ", "ทีมงาน", "ครอบครัว", "จิตใจ", "นิสัย"]
+_VERBS = ["ควรฝึก", "ต้องเข้าใจ", "เรียนรู้ที่จะ", "สามารถพัฒนา", "มักมองข้าม", "ควรให้ความสำคัญกับ"]
+_OBJECTS = ["การตัดสินใจอย่างมีเหตุผล", "ความอดทนต่อความไม่แน่นอน", "การจัดลำดับความสำคัญ",
+            "การสื่อสารที่ชัดเจน", "การควบคุมอารมณ์", "การวางแผนระยะยาว", "ความรับผิดชอบต่อผลลัพธ์",
+            "การยอมรับสิ่งที่ควบคุมไม่ได้", "การสร้างนิสัยเล็กๆ ทุกวัน", "การฟังอย่างตั้งใจ"]
+_REASONS = ["เพราะสิ่งนี้ช่วยลดความผิดพลาด", "ซึ่งนำไปสู่ความสำเร็จที่ยั่งยืน", "เพื่อให้เกิดความสงบภายใน",
+            "อันเป็นรากฐานของความเชื่อใจ", "ทำให้รับมือกับวิกฤตได้ดีขึ้น"]
+
+QUICK_QUERIES = ["สวัสดี", "ขอบคุณครับ", "หวัดดี"]
+REPORTER_QUERIES = ["วันนี้วันอะไร", "ตอนนี้กี่โมง"]
+IMAGE_QUERIES = ["หารูป แมว", "ขอดูรูป ภูเขา"]
+NO_TOOL_QUERIES = ["ช่วยอธิบายเรื่องนี้หน่อย", "ผมควรเริ่มต้นอย่างไรดี", "คิดอย่างไรกับเรื่องนี้"]
+
+
+def _sentence(rng):
+    return f"{rng.choice(_SUBJECTS)}{rng.choice(_VERBS)}{rng.choice(_OBJECTS)} {rng.choice(_REASONS)}"
+
+
+def generate_corpus(num_entries=2000, seed=7):
+    """สร้างรายการหนังสือภาษาไทยสังเคราะห์ในรูปแบบเดียวกับไฟล์ .jsonl ใน data/"""
+    rng = random.Random(seed)
+    books = [(category, title) for category, titles in _BOOKS.items() for title in titles]
+    entries = []
+    for i in range(num_entries):
+        category, book = books[i % len(books)]
+        entries.append({
+            "book_title": book,
+            "category": category,
+            "chapter_title": f"บทที่ {i % 12 + 1}",
+            "title": f"{rng.choice(_OBJECTS)} ตอนที่ {i}",
+            "content": " ".join(_sentence(rng) for _ in range(rng.randint(3, 8))),
+        })
+    return entries
+
+
+def generate_rag_queries(num_queries=50, seed=11):
+    rng = random.Random(seed)
+    return [f"{rng.choice(_SUBJECTS)}ควรทำอย่างไรเรื่อง{rng.choice(_OBJECTS)}" for _ in range(num_queries)]
+
+
+def build_workspace(workspace, num_entries=2000):
+    """
+    เตรียมโฟลเดอร์ทำงานที่มีโครงสร้างเหมือนโปรเจกต์จริง (data/, index/) แล้ว chdir เข้าไป
+    เพื่อให้ ai_bot โหลด index สังเคราะห์แทนของจริง
+    """
+    data_dir = os.path.join(workspace, "data")
+    index_dir = os.path.join(workspace, "index")
+    os.makedirs(data_dir, exist_ok=True)
+
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+    # index ที่มีอยู่ใช้ซ้ำได้เฉพาะเมื่อสร้างจากคลังขนาดเดียวกัน มิฉะนั้นผลจะมาจากคลังเก่าโดยไม่รู้ตัว
+    corpus_info_path = os.path.join(index_dir, CORPUS_INFO_FILE)
+    corpus_info = {"entries": num_entries}
+    existing_info = None
+    if os.path.exists(corpus_info_path) and os.path.exists(os.path.join(index_dir, "faiss.index")):
+        with open(corpus_info_path, "r", encoding="utf-8") as f:
+            existing_info = json.load(f)
+
+    if existing_info != corpus_info:
+        if existing_info:
+            print(f"♻️ คลังหนังสือสังเคราะห์เดิมมี {existing_info.get('entries')} รายการ, สร้างใหม่ {num_entries} รายการ")
+        for filename in os.listdir(data_dir):
+            if filename.endswith(".jsonl"):
+                os.remove(os.path.join(data_dir, filename))
+        entries = generate_corpus(num_entries)
+        per_book = {}
+        for entry in entries:
+            per_book.setdefault(entry["book_title"], []).append(entry)
+        for book, book_entries in per_book.items():
+            with open(os.path.join(data_dir, f"{book}.jsonl"), "w", encoding="utf-8") as f:
+                for entry in book_entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        for name, profile in [("user_profile.json", {"name": "ผู้ทดสอบ"}), ("feng_profile.json", {"name": "เฟิง"})]:
+            with open(os.path.join(data_dir, name), "w", encoding="utf-8") as f:
+                json.dump(profile, f, ensure_ascii=False)
+
+        builder_module = importlib.import_module("เตรียมไฟล์")
+        builder_module.StreamingIndexBuilder(data_dir, index_dir, dedup=False).build(resume=False)
+        with open(corpus_info_path, "w", encoding="utf-8") as f:
+            json.dump(corpus_info, f)
+
+    os.chdir(workspace)
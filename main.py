@@ -1,14 +1,17 @@
 # File: main.py
 
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Request
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from starlette.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from typing import Optional, List
 import os
-import traceback
+import json
 import re
+import time
 import random
+import asyncio
+import functools
 from rapidfuzz import process, fuzz
 from contextlib import asynccontextmanager
 
@@ -18,17 +21,43 @@ from ai_bot import (
     all_book_titles, all_categories,
     knowledge_entries, knowledge_index,
     embedder, reranker,
-    generate_context_with_sources_separated,
+    generate_context_with_sources_separated, generate_contexts_batch,
     clean_response,
     USER_PROFILE, FENG_PROFILE,
     init_short_term_memory_db, add_to_short_term_memory, get_last_n_short_term_memories,
-    get_daily_context,
+    get_short_term_memories_after, get_short_term_memories_before,
+    get_daily_context, long_term_memory,
 )
 from quick_responses import QUICK_RESPONSES
 from modules.reporter import handle_reporter_query
 from modules.system_tools import handle_system_tool_query
 from modules.image_search import search_for_image
-from modules.super_advisor import handle_super_advisor_query
+from modules.super_advisor import (
+    handle_super_advisor_query, QuotaExceededError,
+    retrieve_book_contexts_batch, build_master_prompt, generate_advisor_answer,
+    RAG_TOP_K, RAG_NUM_FINAL_CONTEXT, RAG_SCORE_THRESHOLD,
+)
+from modules.telemetry import configure_logging, get_logger, span, new_request_id, record_request, render_metrics
+from modules.single_flight import SingleFlight, make_advisor_key, last_model_turn_before
+from modules.admission import AdmissionRejected, create_default_controller, PRIORITY_BATCH
+from modules.static_assets import HashedStaticFiles, REVALIDATE_CACHE_CONTROL
+from modules.warmup import run_warm_up
+
+configure_logging()
+logger = get_logger("main")
+
+# คำขอ Super Advisor ที่เหมือนกันและเข้ามาพร้อมกันจะใช้ผลลัพธ์ร่วมกัน (ดู modules/single_flight.py)
+advisor_flight = SingleFlight("advisor_single_flight")
+# จำกัดจำนวนงานพร้อมกันและความยาวคิวแยกตาม lane (fast / image / rag) ดู modules/admission.py
+admission = create_default_controller()
+QUOTA_COOLDOWN_SECONDS = float(os.getenv("QUOTA_COOLDOWN_SECONDS", 30))
+NEW_TURNS_LIMIT = 16
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", 500))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", 2))
+BATCH_ADMISSION_RETRIES = 3
+HISTORY_MAX_LIMIT = 100
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", 1000))
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") != "0"
 
 # --- Lifespan Manager for Startup and Shutdown Events ---
 @asynccontextmanager
@@ -39,17 +68,29 @@ async def lifespan(app: FastAPI):
     # Code to run on startup
     print("🚀 FastAPI is starting up...")
     init_short_term_memory_db()
+    long_term_memory.load()
     print("✅ Memory system initialized.")
+    if WARMUP_ENABLED:
+        await asyncio.to_thread(
+            run_warm_up, embedder, reranker, knowledge_index, knowledge_entries,
+            generate_context_with_sources_separated, PERSONA_BLOCK,
+        )
     
     yield  # The application runs here
     
     # Code to run on shutdown
     print("🌙 FastAPI is shutting down...")
+    long_term_memory.save()
 
 # --- FastAPI App Initialization ---
 app = FastAPI(title="Personal AI Assistant API", lifespan=lifespan)
+# บีบอัดคำตอบ (JSON ของ /ask, HTML, CSS, JS) ที่ใหญ่กว่า GZIP_MINIMUM_SIZE bytes เมื่อ browser รองรับ
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 web_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "web")
-app.mount("/web", StaticFiles(directory=web_dir), name="web")
+static_files = HashedStaticFiles(directory=web_dir, mount_path="/web")
+app.mount("/web", static_files, name="web")
+# index.html ที่ชี้ไปยัง asset ชื่อมี hash (สร้างครั้งเดียวตอนเริ่มระบบ)
+index_page, index_etag = static_files.render_page("index.html")
 
 
 # --- Pydantic Models ---
@@ -61,12 +102,29 @@ class ImageInfo(BaseModel):
 
 class ChatRequest(BaseModel):
     query: str
+    cursor: Optional[int] = None  # id ของข้อความล่าสุดที่ client มีอยู่แล้ว
+
+class HistoryTurn(BaseModel):
+    id: int
+    role: str
+    parts: str
 
 class ChatResponse(BaseModel):
     answer: str
-    history: list
+    history: List[HistoryTurn]  # เฉพาะข้อความใหม่หลัง cursor (ไม่ใช่ประวัติทั้งหมด)
+    cursor: Optional[int] = None
+    has_more: bool = False  # ยังมีข้อความหลัง cursor ที่ไม่ได้ส่งมา ดึงต่อได้จาก /history?after=<cursor>
     image: Optional[ImageInfo] = None
 
+class BatchRequest(BaseModel):
+    queries: List[str]
+    max_concurrency: Optional[int] = None  # ลดจำนวนการเรียก LLM พร้อมกันได้ แต่ไม่เกิน BATCH_LLM_CONCURRENCY
+
+class HistoryPage(BaseModel):
+    turns: List[HistoryTurn]
+    next_before: Optional[int] = None  # ส่งเป็น before เพื่อดึงหน้าที่เก่ากว่า (None = ไม่มีแล้ว)
+    has_more: bool = False  # เมื่อดึงด้วย after: ยังมีข้อความที่ใหม่กว่าหน้านี้อีก
+
 
 def get_emergency_help_response(user_name: str) -> str:
     return f"""แน่นอนครับคุณ{user_name}, ผมสามารถช่วยคุณทำสิ่งเหล่านี้ได้ครับ:
@@ -80,6 +138,32 @@ def get_emergency_help_response(user_name: str) -> str:
 
 ลองใช้คำสั่งเหล่านี้ได้เลยครับ"""
 
+def get_busy_response(user_name: str) -> str:
+    return f"ขออภัยครับคุณ{user_name} ตอนนี้มีคำถามเข้ามาพร้อมกันจำนวนมาก โปรดลองอีกครั้งในอีกสักครู่ครับ"
+
+def to_history_turns(rows) -> List[HistoryTurn]:
+    return [HistoryTurn(id=row_id, role=role, parts=content) for row_id, role, content in rows]
+
+def get_turns_after(after_id: int, limit: int):
+    """คืนค่า (ข้อความหลัง after_id เรียงจากเก่าไปใหม่ไม่เกิน limit รายการ, ยังมีข้อความต่อจากนี้อีกหรือไม่)"""
+    rows = get_short_term_memories_after(after_id, limit=limit + 1)
+    return rows[:limit], len(rows) > limit
+
+def get_new_turns(client_cursor: Optional[int], user_row_id: Optional[int]):
+    """
+    คืนค่า (ข้อความใหม่, cursor ใหม่, has_more) ให้ client ต่อท้ายเอง
+    ถ้า client ส่ง cursor มาจะได้ข้อความถัดจาก cursor (รวมข้อความจากแท็บอื่น) ไม่เกิน NEW_TURNS_LIMIT
+    cursor ใหม่ชี้ไปที่ข้อความสุดท้ายที่ส่งกลับจริงเท่านั้น ส่วนที่เหลือ (has_more) ดึงต่อได้จาก /history?after=
+    ถ้าไม่มีทั้ง cursor และ id ของคำถาม (บันทึกไม่สำเร็จ) จะส่งข้อความล่าสุดแทน ไม่ใช่ไล่จากต้นประวัติ
+    """
+    if client_cursor is None and user_row_id is None:
+        rows = get_short_term_memories_before(None, NEW_TURNS_LIMIT)
+        return to_history_turns(rows), (rows[-1][0] if rows else None), False
+    after_id = client_cursor if client_cursor is not None else user_row_id - 1
+    rows, has_more = get_turns_after(after_id, NEW_TURNS_LIMIT)
+    new_cursor = rows[-1][0] if rows else client_cursor
+    return to_history_turns(rows), new_cursor, has_more
+
 def get_quick_response_safely(query: str, response_list: list, score_cutoff=90, max_words=4) -> Optional[str]:
     if len(query.split()) > max_words:
         return None
@@ -87,39 +171,155 @@ def get_quick_response_safely(query: str, response_list: list, score_cutoff=90,
         result = process.extractOne(query, item["questions"], scorer=fuzz.ratio)
         if result and result[1] >= score_cutoff:
             matched_question, score, _ = result
-            print(f"⚡️ [Quick Response] Found a safe match: '{matched_question}' (Score: {score:.2f})")
+            logger.debug(f"⚡️ [Quick Response] Found a safe match: '{matched_question}' (Score: {score:.2f})")
             return random.choice(item["answers"])
     return None
 
 
 # --- API Endpoints ---
-@app.get("/", response_class=FileResponse)
-async def read_root():
-    return FileResponse(os.path.join(web_dir, 'index.html'))
+@app.get("/", response_class=HTMLResponse)
+async def read_root(request: Request):
+    headers = {"ETag": index_etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if index_etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content=index_page, headers=headers)
+
+@app.get("/ready")
+async def ready():
+    # uvicorn ไม่รับ connection จนกว่า lifespan startup (รวม warm-up) จะเสร็จ
+    # endpoint นี้จึงตอบได้เมื่อระบบพร้อมแล้วเท่านั้น ระหว่าง warm-up probe จะต่อไม่ติดแทนที่จะได้ 503
+    return {"ready": True}
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+async def run_in_batch_lane(func):
+    """รันงานใน lane rag ด้วย priority ต่ำกว่าคำถามจากหน้าเว็บ และลองใหม่เมื่อคิวเต็ม (ยกเว้นช่วงพักโควต้า)"""
+    for attempt in range(BATCH_ADMISSION_RETRIES + 1):
+        try:
+            async with admission.slot("rag", PRIORITY_BATCH):
+                return await asyncio.to_thread(func)
+        except AdmissionRejected as rejected:
+            if rejected.reason == "cooldown" or attempt == BATCH_ADMISSION_RETRIES:
+                raise
+            await asyncio.sleep(2 ** attempt)
+
+@app.post("/ask/batch")
+async def ask_batch(batch_request: BatchRequest):
+    """
+    ตอบคำถามจำนวนมากในคำขอเดียว (สำหรับงาน batch) และส่งผลกลับเป็น JSON Lines ทีละบรรทัดตามลำดับที่เสร็จ
+    ทุกคำถามถูก embed / ค้น FAISS / rerank พร้อมกันในครั้งเดียว ส่วน Gemini ถูกเรียกพร้อมกันไม่เกิน
+    BATCH_LLM_CONCURRENCY คำขอ คำถามแบบ batch ไม่ถูกบันทึกลงความจำและไม่ใช้ประวัติการสนทนา
+    """
+    queries = [query.strip() for query in batch_request.queries]
+    if len(queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"ส่งคำถามได้ไม่เกิน {BATCH_MAX_QUERIES} ข้อต่อคำขอ")
+    concurrency = max(1, min(batch_request.max_concurrency or BATCH_LLM_CONCURRENCY, BATCH_LLM_CONCURRENCY))
+    request_id = new_request_id()
+    user_name = USER_PROFILE.get('name', 'เพื่อน')
+
+    def result_line(index, answer=None, sources=None, error=None):
+        record = {"index": index, "query": queries[index], "answer": answer, "sources": sources or [], "error": error}
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    async def answer_one(index, context_from_books, sources, daily_context, semaphore):
+        if not queries[index]:
+            return result_line(index, error="empty_query")
+        if not GEMINI_MODEL:
+            return result_line(index, sources=sources, error="llm_unavailable")
+        async with semaphore:
+            with span("prompt_build"):
+                master_prompt = build_master_prompt(queries[index], PERSONA_BLOCK, user_name, [], daily_context, context_from_books)
+            try:
+                answer = await run_in_batch_lane(functools.partial(
+                    generate_advisor_answer, master_prompt, GEMINI_MODEL, GEMINI_CONFIG, clean_response))
+            except QuotaExceededError:
+                admission.cool_down("rag", QUOTA_COOLDOWN_SECONDS)
+                return result_line(index, sources=sources, error="quota_exceeded")
+            except AdmissionRejected as rejected:
+                return result_line(index, sources=sources, error="quota_exceeded" if rejected.reason == "cooldown" else "busy")
+        return result_line(index, answer=answer, sources=sources, error=None if answer else "no_answer")
+
+    async def stream_results():
+        request_start = time.perf_counter()
+        logger.info(f"📦 [Batch] request={request_id} {len(queries)} queries, llm_concurrency={concurrency}")
+        try:
+            contexts = await run_in_batch_lane(functools.partial(
+                retrieve_book_contexts_batch, queries, knowledge_index, knowledge_entries, embedder, generate_contexts_batch,
+                top_k=RAG_TOP_K, num_final_context=RAG_NUM_FINAL_CONTEXT, score_threshold=RAG_SCORE_THRESHOLD,
+            ))
+        except Exception as e:
+            logger.error(f"❌ [Batch] request={request_id} retrieval failed: {e}")
+            record_request("batch_error", time.perf_counter() - request_start)
+            for index in range(len(queries)):
+                yield result_line(index, error="retrieval_failed")
+            return
+
+        daily_context = get_daily_context()
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [
+            asyncio.create_task(answer_one(index, context_from_books, sources, daily_context, semaphore))
+            for index, (context_from_books, sources) in enumerate(contexts)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # client ตัดการเชื่อมต่อกลางทาง: ยกเลิกงานที่ยังไม่เสร็จ
+            for task in tasks:
+                task.cancel()
+        record_request("batch", time.perf_counter() - request_start)
+
+    # GZipMiddleware ไม่ flush ระหว่าง chunk: ระบุ identity เพื่อให้แต่ละบรรทัดถึง client ทันทีที่เสร็จ
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson", headers={"Content-Encoding": "identity"})
+
+@app.get("/history", response_model=HistoryPage)
+async def get_history(before: Optional[int] = None, after: Optional[int] = None, limit: int = 20):
+    """
+    ดึงประวัติทีละหน้า: before=<id> ย้อนไปข้อความที่เก่ากว่า (ไม่ระบุ = หน้าล่าสุด)
+    หรือ after=<cursor> เดินหน้าไปข้อความที่ใหม่กว่า cursor (ใช้เมื่อ /ask ตอบ has_more)
+    """
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    if after is not None:
+        if before is not None:
+            raise HTTPException(status_code=400, detail="ระบุได้เพียง before หรือ after อย่างใดอย่างหนึ่ง")
+        rows, has_more = await asyncio.to_thread(get_turns_after, after, limit)
+        return HistoryPage(turns=to_history_turns(rows), has_more=has_more)
+    rows = await asyncio.to_thread(get_short_term_memories_before, before, limit)
+    next_before = rows[0][0] if len(rows) == limit else None
+    return HistoryPage(turns=to_history_turns(rows), next_before=next_before)
 
 @app.post("/ask", response_model=ChatResponse)
-async def ask_question(chat_request: ChatRequest):
+async def ask_question(chat_request: ChatRequest, background_tasks: BackgroundTasks):
     query = chat_request.query
     ai_answer = "ขออภัยครับ มีบางอย่างผิดพลาดในการประมวลผล"
     is_non_ai_module_used = False
     image_to_display = None
+    route = "error"
+    request_id = new_request_id()
+    request_start = time.perf_counter()
+    user_row_id = None
 
     try:
-        add_to_short_term_memory('user', query)
+        user_row_id = add_to_short_term_memory('user', query)
         short_term_memory = get_last_n_short_term_memories(n=15)
         user_name = USER_PROFILE.get('name', 'เพื่อน')
         q_lower = query.lower()
 
-        # Flow 0 & 0.5: Check for Help and Quick Responses
-        if any(keyword in q_lower for keyword in ["ทำอะไรได้บ้าง", "ใช้ทำอะไรได้"]):
-            ai_answer = get_emergency_help_response(user_name)
-            is_non_ai_module_used = True
-        
-        if not is_non_ai_module_used:
-            quick_response = get_quick_response_safely(q_lower, QUICK_RESPONSES)
-            if quick_response:
-                ai_answer = quick_response.replace("{user_name}", user_name)
-                is_non_ai_module_used = True
+        with span("routing"):
+            # Flow 0 & 0.5: Check for Help and Quick Responses
+            if any(keyword in q_lower for keyword in ["ทำอะไรได้บ้าง", "ใช้ทำอะไรได้"]):
+                ai_answer = get_emergency_help_response(user_name)
+                is_non_ai_module_used, route = True, "help"
+
+            if not is_non_ai_module_used:
+                quick_response = get_quick_response_safely(q_lower, QUICK_RESPONSES)
+                if quick_response:
+                    ai_answer = quick_response.replace("{user_name}", user_name)
+                    is_non_ai_module_used, route = True, "quick_response"
 
         # Flow 1-4: Check for Rule-Based Tools
         if not is_non_ai_module_used:
@@ -127,61 +327,93 @@ async def ask_question(chat_request: ChatRequest):
             reporter_keywords = ["วันนี้วันอะไร", "วันที่เท่าไหร่", "ตอนนี้กี่โมง", "เวลาอะไร"]
             if any(keyword in q_lower for keyword in reporter_keywords):
                 ai_answer = handle_reporter_query(q_lower, get_daily_context(), user_name)
-                is_non_ai_module_used = True
+                is_non_ai_module_used, route = True, "reporter"
             
             # System Tools
             if not is_non_ai_module_used:
-                system_tool_response = handle_system_tool_query(query)
+                async with admission.slot("fast"):
+                    with span("system_tools"):
+                        system_tool_response = await handle_system_tool_query(query)
                 if system_tool_response:
                     ai_answer = system_tool_response
-                    is_non_ai_module_used = True
+                    is_non_ai_module_used, route = True, "system_tools"
 
             # Image Search
             if not is_non_ai_module_used:
                 image_search_match = re.search(r"(หารูป|ขอดูรูป|สร้างภาพ|หาภาพ)\s+(.+)", query, re.IGNORECASE)
                 if image_search_match:
                     search_term = image_search_match.group(2).strip()
-                    print(f"🖼️ [Image Search] User requested: '{search_term}'")
-                    image_to_display = search_for_image(search_term)
+                    logger.info(f"🖼️ [Image Search] User requested: '{search_term}'")
+                    async with admission.slot("image"):
+                        with span("image_search"):
+                            image_to_display = await asyncio.to_thread(search_for_image, search_term)
                     ai_answer = f"นี่คือรูป '{search_term}' ที่ผมหามาให้ครับ" if image_to_display else f"ขออภัยครับ, ผมหารูป '{search_term}' ไม่เจอ"
-                    is_non_ai_module_used = True
+                    is_non_ai_module_used, route = True, "image_search"
 
         # Flow 5: The One and Only Super Advisor
         if not is_non_ai_module_used:
-            print("🚀 [Flow Control] Handing over to Super Advisor...")
+            logger.info(f"🚀 [Flow Control] request={request_id} Handing over to Super Advisor...")
+            route = "super_advisor"
             daily_context = get_daily_context()
 
             if not GEMINI_MODEL:
                 ai_answer = "ขออภัยครับ ตอนนี้ผมไม่สามารถเชื่อมต่อกับระบบ AI หลักได้"
+                route = "advisor_unavailable"
             else:
-                final_ai_answer = handle_super_advisor_query(
+                run_advisor = functools.partial(
+                    handle_super_advisor_query,
                     query=query, q_lower=q_lower, persona_block=PERSONA_BLOCK,
                     gemini_model=GEMINI_MODEL, config=GEMINI_CONFIG, clean_func=clean_response,
                     user_profile=USER_PROFILE, short_term_memory=short_term_memory,
                     daily_context=daily_context,
                     all_book_titles=all_book_titles, all_categories=all_categories,
                     knowledge_index=knowledge_index, knowledge_entries=knowledge_entries,
-                    embedder=embedder, generate_context_func=generate_context_with_sources_separated
+                    embedder=embedder, generate_context_func=generate_context_with_sources_separated,
+                    long_term_memory=long_term_memory
                 )
+                async def run_in_rag_lane():
+                    async with admission.slot("rag"):
+                        return await asyncio.to_thread(run_advisor)
+
+                flight_key = make_advisor_key(query, last_model_turn_before(user_row_id), daily_context)
+                try:
+                    final_ai_answer = await advisor_flight.do(flight_key, run_in_rag_lane)
+                except QuotaExceededError:
+                    admission.cool_down("rag", QUOTA_COOLDOWN_SECONDS)
+                    final_ai_answer = f"ขออภัยครับคุณ{user_name}, ตอนนี้โควต้า API ของผมเต็มแล้ว โปรดลองอีกครั้งในภายหลัง"
+                    route = "quota_exceeded"
+                except AdmissionRejected as rejected:
+                    route = "shed"
+                    if rejected.reason == "cooldown":
+                        final_ai_answer = f"ขออภัยครับคุณ{user_name}, ตอนนี้โควต้า API ของผมเต็มแล้ว โปรดลองอีกครั้งในภายหลัง"
+                    else:
+                        final_ai_answer = get_busy_response(user_name)
                 
                 if final_ai_answer:
                     ai_answer = final_ai_answer
                 else:
                     ai_answer = f"เรื่องนี้ผมอาจจะยังไม่มีข้อมูลที่แน่ชัดครับคุณ{user_name} ลองถามผมในหัวข้ออื่นได้นะครับ"
+                    if route == "super_advisor":
+                        route = "advisor_no_answer"
 
-        add_to_short_term_memory('model', ai_answer)
+        model_row_id = add_to_short_term_memory('model', ai_answer, reply_to=user_row_id, route=route)
+        # embed คู่ถาม-ตอบลงความทรงจำระยะยาวหลังส่งคำตอบแล้ว ผู้ใช้จึงไม่ต้องรอ (เก็บเฉพาะคำตอบจาก Super Advisor)
+        background_tasks.add_task(long_term_memory.add_exchange, model_row_id, query, ai_answer, route)
         
-        final_history = get_last_n_short_term_memories(n=16) 
-        updated_history_for_display = [{"role": role, "parts": content} for role, content in final_history]
+        new_turns, cursor, has_more = get_new_turns(chat_request.cursor, user_row_id)
+        record_request(route, time.perf_counter() - request_start)
 
-        return ChatResponse(answer=ai_answer, history=updated_history_for_display, image=image_to_display)
+        return ChatResponse(answer=ai_answer, history=new_turns, cursor=cursor, has_more=has_more, image=image_to_display)
 
     except Exception as e:
-        print(f"❌ เกิดข้อผิดพลาดร้ายแรงใน Endpoint /ask: {e}")
-        traceback.print_exc()
         user_name = USER_PROFILE.get('name', 'เพื่อน')
-        error_message = f"ขออภัยครับคุณ{user_name} เกิดข้อผิดพลาดร้ายแรงในระบบ โปรดลองอีกครั้งในภายหลัง"
-        add_to_short_term_memory('model', error_message)
-        final_history = get_last_n_short_term_memories(n=16)
-        updated_history_for_display = [{"role": r, "parts": c} for r, c in final_history]
-        return ChatResponse(answer=error_message, history=updated_history_for_display, image=None)
\ No newline at end of file
+        if isinstance(e, AdmissionRejected):
+            record_request("shed", time.perf_counter() - request_start)
+            error_message = get_busy_response(user_name)
+        else:
+            logger.exception(f"❌ เกิดข้อผิดพลาดร้ายแรงใน Endpoint /ask (request={request_id}): {e}")
+            record_request("error", time.perf_counter() - request_start)
+            error_message = f"ขออภัยครับคุณ{user_name} เกิดข้อผิดพลาดร้ายแรงในระบบ โปรดลองอีกครั้งในภายหลัง"
+        add_to_short_term_memory('model', error_message, reply_to=user_row_id, route="shed" if isinstance(e, AdmissionRejected) else "error")
+        new_turns, cursor, has_more = get_new_turns(chat_request.cursor, user_row_id)
+        return ChatResponse(answer=error_message, history=new_turns, cursor=cursor, has_more=has_more, image=None)
\ No newline at end of file
@@ -0,0 +1,145 @@
+# File: modules/admission.py
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from modules.telemetry import get_logger, record_lane_state, record_lane_wait, record_lane_rejection
+
+logger = get_logger("admission")
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+
+class AdmissionRejected(Exception):
+    """คำขอถูกปฏิเสธเพราะคิวเต็ม, รอนานเกินกำหนด หรือ lane อยู่ในช่วงพักหลังโควต้าเต็ม"""
+
+    def __init__(self, lane: str, reason: str):
+        super().__init__(f"lane '{lane}' rejected request: {reason}")
+        self.lane = lane
+        self.reason = reason
+
+
+class Lane:
+    """
+    จำกัดจำนวนงานที่ทำพร้อมกัน (max_concurrency) และจำนวนคำขอที่รอคิว (max_queue)
+    คิวเรียงตาม priority (ค่าน้อยได้ก่อน) แล้วตามลำดับการมาถึง
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def _report(self):
+        record_lane_state(self.name, len(self._waiters), self.in_flight)
+
+    def _reject(self, reason: str):
+        record_lane_rejection(self.name, reason)
+        logger.warning(f"🚦 [Admission] lane={self.name} rejected ({reason}) in_flight={self.in_flight} queued={len(self._waiters)}")
+        raise AdmissionRejected(self.name, reason)
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        if time.monotonic() < self.cooldown_until:
+            self._reject("cooldown")
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            self._report()
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full")
+
+        start = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._sequence), waiter)
+        heapq.heappush(self._waiters, entry)
+        self._report()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            granted = waiter.done() and not waiter.cancelled()
+            if isinstance(e, asyncio.CancelledError):
+                if granted:
+                    # ได้ slot มาพอดีตอนถูกยกเลิก: คืน slot ให้คนถัดไป
+                    self.release()
+                else:
+                    self._remove_waiter(waiter, entry)
+                raise
+            if not granted:
+                self._remove_waiter(waiter, entry)
+                self._reject("timeout")
+            # ได้ slot มาพอดีตอนหมดเวลา: ใช้ slot นั้นต่อแทนการปฏิเสธ
+        record_lane_wait(self.name, time.monotonic() - start)
+
+    def _remove_waiter(self, waiter, entry):
+        waiter.cancel()
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+        self._report()
+
+    def release(self):
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                # ส่งต่อ slot ให้ผู้รอคนถัดไปโดยตรง in_flight จึงไม่เปลี่ยน
+                waiter.set_result(None)
+                self._report()
+                return
+        self.in_flight -= 1
+        self._report()
+
+
+class AdmissionController:
+    def __init__(self, lanes: Dict[str, Lane]):
+        self.lanes = lanes
+
+    @asynccontextmanager
+    async def slot(self, lane_name: str, priority: int = PRIORITY_INTERACTIVE):
+        lane = self.lanes[lane_name]
+        await lane.acquire(priority)
+        try:
+            yield
+        finally:
+            lane.release()
+
+    def cool_down(self, lane_name: str, seconds: float):
+        """หยุดรับคำขอใหม่ใน lane นี้ชั่วคราว (ใช้เมื่อ Gemini ตอบ 429 โควต้าเต็ม)"""
+        lane = self.lanes[lane_name]
+        lane.cooldown_until = max(lane.cooldown_until, time.monotonic() + seconds)
+        logger.warning(f"🧊 [Admission] lane={lane_name} cooling down for {seconds:.0f}s")
+
+    def snapshot(self):
+        return {
+            name: {"in_flight": lane.in_flight, "queued": len(lane._waiters), "max_concurrency": lane.max_concurrency}
+            for name, lane in self.lanes.items()
+        }
+
+
+def create_default_controller() -> AdmissionController:
+    """
+    lane เริ่มต้น:
+    - fast:  system tools (subprocess / clipboard / เสียง) แยกจาก RAG จึงไม่ต้องรอคิวหลัง LLM
+             (reporter ไม่ผ่าน lane เพราะทำงานแบบ synchronous ทันทีโดยไม่ yield)
+    - image: ค้นหารูปจาก Unsplash
+    - rag:   Super Advisor (embed → search → rerank → Gemini)
+    """
+    return AdmissionController({
+        "fast": Lane("fast", int(os.getenv("FAST_MAX_CONCURRENCY", 32)), int(os.getenv("FAST_MAX_QUEUE", 256)), 5.0),
+        "image": Lane("image", int(os.getenv("IMAGE_MAX_CONCURRENCY", 8)), int(os.getenv("IMAGE_MAX_QUEUE", 32)), 10.0),
+        "rag": Lane(
+            "rag",
+            int(os.getenv("RAG_MAX_CONCURRENCY", 4)),
+            int(os.getenv("RAG_MAX_QUEUE", 16)),
+            float(os.getenv("RAG_QUEUE_TIMEOUT", 30)),
+        ),
+    })
@@ -0,0 +1,82 @@
+# File: modules/deduplicator.py
+
+import re
+import zlib
+import hashlib
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_content(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+class ChunkDeduplicator:
+    """
+    ตัวกรองข้อมูลซ้ำตอนสร้าง Index
+
+    - ซ้ำแบบตรงตัว: เทียบ hash ของเนื้อหาที่ normalize แล้ว
+    - ซ้ำแบบเกือบเหมือน: ใช้ MinHash บน character shingle (เหมาะกับภาษาไทยที่ไม่มีการเว้นวรรคคำ)
+      และ LSH แบ่งเป็น band เพื่อหาคู่ที่น่าสงสัย ก่อนยืนยันด้วยค่า Jaccard โดยประมาณ
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 5,
+                 near_threshold: float = 0.85, seed: int = 42):
+        if num_perm % bands:
+            raise ValueError("num_perm ต้องหารด้วย bands ลงตัว")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.near_threshold = near_threshold
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+
+        self._exact: Dict[bytes, int] = {}
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+
+    def _signature(self, normalized: str) -> np.ndarray:
+        k = self.shingle_size
+        shingles = {normalized[i:i + k] for i in range(max(1, len(normalized) - k + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        hashes %= _MERSENNE_PRIME
+        return ((self._a * hashes + self._b) % _MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def check(self, content: str) -> Optional[Tuple[str, int, float]]:
+        """คืนค่า (ชนิด, id ที่ซ้ำ, ความคล้าย) ถ้าเนื้อหานี้ซ้ำกับรายการที่เก็บไว้แล้ว หรือ None ถ้าไม่ซ้ำ"""
+        normalized = normalize_content(content)
+        digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+        if digest in self._exact:
+            return "exact", self._exact[digest], 1.0
+
+        signature = self._signature(normalized)
+        best_id, best_score = None, 0.0
+        seen = set()
+        for band, key in self._band_keys(signature):
+            for candidate_id in self._buckets[band].get(key, ()):
+                if candidate_id in seen: continue
+                seen.add(candidate_id)
+                score = float(np.mean(self._signatures[candidate_id] == signature))
+                if score > best_score:
+                    best_id, best_score = candidate_id, score
+        if best_id is not None and best_score >= self.near_threshold:
+            return "near", best_id, best_score
+        return None
+
+    def register(self, entry_id: int, content: str) -> None:
+        normalized = normalize_content(content)
+        self._exact[hashlib.sha1(normalized.encode("utf-8")).digest()] = entry_id
+        signature = self._signature(normalized)
+        self._signatures[entry_id] = signature
+        for band, key in self._band_keys(signature):
+            self._buckets[band].setdefault(key, []).append(entry_id)
@@ -4,6 +4,10 @@ import os
 import requests
 from typing import Optional, Dict
 
+from modules.telemetry import get_logger
+
+logger = get_logger("image_search")
+
 UNSPLASH_ACCESS_KEY = os.getenv("UNSPLASH_ACCESS_KEY")
 UNSPLASH_API_URL = "https://api.unsplash.com/search/photos"
 
@@ -25,7 +29,7 @@ def search_for_image(query: str) -> Optional[Dict]:
                          }
     """
     if not UNSPLASH_ACCESS_KEY:
-        print("❌ [Image Search] Error: UNSPLASH_ACCESS_KEY is not set in the .env file.")
+        logger.error("❌ [Image Search] Error: UNSPLASH_ACCESS_KEY is not set in the .env file.")
         return None
 
     params = {
@@ -40,7 +44,7 @@ def search_for_image(query: str) -> Optional[Dict]:
     }
 
     try:
-        print(f"🖼️  [Image Search] Searching for '{query}' on Unsplash...")
+        logger.info(f"🖼️  [Image Search] Searching for '{query}' on Unsplash...")
         response = requests.get(UNSPLASH_API_URL, headers=headers, params=params, timeout=10)
         response.raise_for_status()
 
@@ -55,15 +59,15 @@ def search_for_image(query: str) -> Optional[Dict]:
                 "photographer": first_image['user']['name'],
                 "profile_url": first_image['user']['links']['html']
             }
-            print(f"✅ [Image Search] Found image by {image_info['photographer']}")
+            logger.info(f"✅ [Image Search] Found image by {image_info['photographer']}")
             return image_info
         else:
-            print(f"🟡 [Image Search] No results found for '{query}'.")
+            logger.info(f"🟡 [Image Search] No results found for '{query}'.")
             return None
 
     except requests.exceptions.RequestException as e:
-        print(f"❌ [Image Search] Error connecting to Unsplash API: {e}")
+        logger.error(f"❌ [Image Search] Error connecting to Unsplash API: {e}")
         return None
     except Exception as e:
-        print(f"❌ [Image Search] An unexpected error occurred: {e}")
+        logger.error(f"❌ [Image Search] An unexpected error occurred: {e}")
         return None
\ No newline at end of file
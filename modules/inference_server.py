@@ -0,0 +1,396 @@
+# File: modules/inference_server.py
+#
+# Inference sidecar: โปรเซสเดียวที่ถือโมเดล Embedding, Reranker, FAISS index และข้อมูลหนังสือ
+# แล้วให้บริการ embed/search/rerank ผ่าน Unix socket พร้อมรวมคำขอเป็น batch
+# uvicorn worker แต่ละตัวจึงไม่ต้องโหลดโมเดลซ้ำ (ตั้งค่า INFERENCE_SOCKET ใน .env เพื่อเปิดใช้)
+#
+# รัน: python -m modules.inference_server --socket /tmp/consultant_inference.sock
+
+import os
+import json
+import base64
+import socket
+import struct
+import asyncio
+import argparse
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from modules.telemetry import configure_logging, get_logger
+
+logger = get_logger("inference_server")
+
+EMBEDDER_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+RERANKER_MODEL_NAME = "jinaai/jina-reranker-v1-turbo-en"
+DEFAULT_SOCKET_PATH = "/tmp/consultant_inference.sock"
+
+_HEADER = struct.Struct("!I")
+
+
+def _encode_array(array):
+    array = np.ascontiguousarray(array)
+    return {"dtype": str(array.dtype), "shape": list(array.shape), "data": base64.b64encode(array.tobytes()).decode("ascii")}
+
+
+def _decode_array(payload):
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype=payload["dtype"]).reshape(payload["shape"])
+
+
+# ==============================================================================
+# ฝั่งเซิร์ฟเวอร์
+# ==============================================================================
+
+class _Batcher:
+    """
+    รวมคำขอที่เข้ามาภายใน `window` วินาที (ไม่เกิน `max_items` รายการย่อย) แล้วเรียก `run_batch` ครั้งเดียว
+    run_batch รับ list ของรายการย่อยทั้งหมดและต้องคืนผลลัพธ์ที่ยาวเท่ากัน
+    """
+
+    def __init__(self, run_batch, executor, window=0.005, max_items=256):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.window = window
+        self.max_items = max_items
+        self.queue = asyncio.Queue()
+
+    async def submit(self, items):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((items, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.window
+            while size < self.max_items:
+                timeout = deadline - loop.time()
+                if timeout <= 0: break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            flat = [x for items, _ in batch for x in items]
+            try:
+                outputs = await loop.run_in_executor(self.executor, self.run_batch, flat)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done(): future.set_exception(e)
+                continue
+            offset = 0
+            for items, future in batch:
+                if not future.done():
+                    future.set_result(outputs[offset:offset + len(items)])
+                offset += len(items)
+
+
+class InferenceServer:
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, index_folder="./index", batch_window_ms=5.0,
+                 memory_db_path="data/memory.db"):
+        self.socket_path = socket_path
+        self.index_folder = index_folder
+        self.memory_db_path = memory_db_path
+        self.batch_window = batch_window_ms / 1000
+
+    def load(self):
+        import torch
+        import faiss
+        from sentence_transformers import SentenceTransformer, CrossEncoder
+        from modules.knowledge_store import load_knowledge_entries
+        from modules.long_term_memory import LongTermMemory
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        logger.info(f"⏳ [Inference] กำลังโหลดโมเดลบน {device.upper()}...")
+        self.embedder = SentenceTransformer(EMBEDDER_MODEL_NAME, device=device)
+        self.reranker = CrossEncoder(RERANKER_MODEL_NAME, device=device, trust_remote_code=True)
+        self.index = faiss.read_index(os.path.join(self.index_folder, "faiss.index"))
+        self.entries = load_knowledge_entries(self.index_folder)
+        self.catalog = {
+            "book_titles": sorted({e.get("book_title", "").strip() for e in self.entries.values() if e.get("book_title")}),
+            "categories": sorted({e.get("category", "").strip() for e in self.entries.values() if e.get("category")}),
+        }
+        logger.info(f"✅ [Inference] โหลดเสร็จ: {self.index.ntotal} vectors, {len(self.entries)} entries")
+        # ความทรงจำระยะยาวอยู่ที่ sidecar เพื่อให้มีผู้เขียน index เพียง process เดียวเมื่อรันหลาย worker
+        self.long_term_memory = LongTermMemory(self.embedder, db_path=self.memory_db_path)
+        self.long_term_memory.load()
+
+    # --- ฟังก์ชันที่รันใน executor (เธรดเดียว เพื่อไม่ให้โมเดลถูกเรียกพร้อมกัน) ---
+    def _embed_batch(self, texts):
+        return self.embedder.encode(texts, batch_size=64, convert_to_numpy=True).astype("float32")
+
+    def _rerank_batch(self, pairs):
+        return np.asarray(self.reranker.predict(pairs, batch_size=64), dtype="float32")
+
+    def _search_batch(self, items):
+        vectors = np.stack([vector for vector, _ in items]).astype("float32")
+        k = max(k for _, k in items)
+        distances, indices = self.index.search(vectors, k)
+        return [(distances[i, :k_i], indices[i, :k_i]) for i, (_, k_i) in enumerate(items)]
+
+    async def _dispatch(self, request):
+        op = request["op"]
+        if op == "embed":
+            vectors = await self.embed_batcher.submit(request["texts"])
+            return {"embeddings": _encode_array(np.stack(vectors))}
+        if op == "rerank":
+            scores = await self.rerank_batcher.submit([tuple(pair) for pair in request["pairs"]])
+            return {"scores": _encode_array(np.asarray(scores, dtype="float32"))}
+        if op == "search":
+            queries = _decode_array(request["vectors"])
+            results = await self.search_batcher.submit([(row, request["k"]) for row in queries])
+            return {
+                "distances": _encode_array(np.stack([d for d, _ in results])),
+                "indices": _encode_array(np.stack([i for _, i in results])),
+            }
+        if op == "entries":
+            return {"entries": [self.entries.get(str(key)) for key in request["keys"]]}
+        if op == "ltm_search":
+            memories = await asyncio.get_running_loop().run_in_executor(
+                self.executor, functools.partial(
+                    self.long_term_memory.search, _decode_array(request["vector"]), k=request["k"],
+                    recent_turns=request["recent_turns"], min_similarity=request["min_similarity"],
+                ))
+            return {"memories": memories}
+        if op == "ltm_add":
+            await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.long_term_memory.add_exchange,
+                request["model_row_id"], request["user_text"], request["model_text"], request["route"],
+            )
+            return {}
+        if op == "ltm_info":
+            index = self.long_term_memory.index
+            return {"size": int(index.ntotal) if index is not None else 0}
+        if op == "info":
+            return {"ntotal": int(self.index.ntotal), "dim": int(self.index.d), "entries": len(self.entries), **self.catalog}
+        raise ValueError(f"unknown op '{op}'")
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(_HEADER.size)
+                request = json.loads(await reader.readexactly(_HEADER.unpack(header)[0]))
+                try:
+                    response = {"ok": True, **(await self._dispatch(request))}
+                except Exception as e:
+                    logger.error(f"❌ [Inference] {request.get('op')} failed: {e}")
+                    response = {"ok": False, "error": str(e)}
+                body = json.dumps(response, ensure_ascii=False).encode("utf-8")
+                writer.write(_HEADER.pack(len(body)) + body)
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        executor = self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.embed_batcher = _Batcher(self._embed_batch, executor, self.batch_window)
+        self.rerank_batcher = _Batcher(self._rerank_batch, executor, self.batch_window, max_items=512)
+        self.search_batcher = _Batcher(self._search_batch, executor, self.batch_window)
+        workers = [asyncio.create_task(b.run()) for b in (self.embed_batcher, self.rerank_batcher, self.search_batcher)]
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        logger.info(f"🚀 [Inference] พร้อมให้บริการที่ {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for worker in workers: worker.cancel()
+            executor.shutdown(wait=False)
+            self.long_term_memory.save()
+
+
+# ==============================================================================
+# ฝั่ง client (ใช้ใน uvicorn worker)
+# ==============================================================================
+
+class InferenceClient:
+    """client แบบ synchronous ที่ใช้ socket แยกต่อเธรด เรียกใช้ได้จากโค้ดเดิมที่เป็น sync"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=60.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._local.sock = sock
+        return sock
+
+    def _recv_exactly(self, sock, size):
+        chunks, remaining = [], size
+        while remaining:
+            chunk = sock.recv(min(remaining, 1 << 20))
+            if not chunk:
+                raise ConnectionError("inference server closed the connection")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def call(self, op, **payload):
+        body = json.dumps({"op": op, **payload}, ensure_ascii=False).encode("utf-8")
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None) or self._connect()
+            try:
+                sock.sendall(_HEADER.pack(len(body)) + body)
+                size = _HEADER.unpack(self._recv_exactly(sock, _HEADER.size))[0]
+                response = json.loads(self._recv_exactly(sock, size))
+                break
+            except (ConnectionError, OSError):
+                sock.close()
+                self._local.sock = None
+                if attempt: raise
+        if not response.get("ok"):
+            raise RuntimeError(f"inference server error ({op}): {response.get('error')}")
+        return response
+
+    def info(self):
+        return self.call("info")
+
+
+class RemoteEmbedder:
+    """ใช้แทน SentenceTransformer.encode (รองรับเฉพาะผลลัพธ์แบบ numpy)"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def encode(self, sentences, convert_to_numpy=True, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = _decode_array(self.client.call("embed", texts=texts)["embeddings"])
+        return embeddings[0] if single else embeddings
+
+
+class RemoteReranker:
+    def __init__(self, client):
+        self.client = client
+
+    def predict(self, sentence_pairs, **kwargs):
+        pairs = [list(pair) for pair in sentence_pairs]
+        return _decode_array(self.client.call("rerank", pairs=pairs)["scores"])
+
+
+class RemoteIndex:
+    """ใช้แทน faiss.Index สำหรับการค้นหา (search) อย่างเดียว"""
+
+    def __init__(self, client, info):
+        self.client = client
+        self.ntotal = info["ntotal"]
+        self.d = info["dim"]
+
+    def search(self, x, k):
+        response = self.client.call("search", vectors=_encode_array(np.asarray(x, dtype="float32")), k=int(k))
+        return _decode_array(response["distances"]), _decode_array(response["indices"])
+
+
+class RemoteEntries:
+    """ใช้แทน dict ของ knowledge_entries โดยดึงข้อมูลจาก sidecar เมื่อใช้ และเก็บ LRU cache ไว้"""
+
+    def __init__(self, client, info, cache_size=4096):
+        self.client = client
+        self._len = info["entries"]
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._len
+
+    def get_many(self, keys):
+        keys = [str(key) for key in keys]
+        with self._lock:
+            missing = [key for key in keys if key not in self._cache]
+        if missing:
+            fetched = self.client.call("entries", keys=missing)["entries"]
+            with self._lock:
+                for key, entry in zip(missing, fetched):
+                    self._cache[key] = entry
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        with self._lock:
+            results = []
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                results.append(self._cache.get(key))
+            return results
+
+    def get(self, key, default=None):
+        entry = self.get_many([key])[0]
+        return default if entry is None else entry
+
+    def __getitem__(self, key):
+        entry = self.get_many([key])[0]
+        if entry is None:
+            raise KeyError(key)
+        return entry
+
+    def __contains__(self, key):
+        return self.get_many([key])[0] is not None
+
+
+class RemoteLongTermMemory:
+    """
+    ใช้แทน LongTermMemory: index ความทรงจำระยะยาวมีเจ้าของคือ sidecar ตัวเดียว
+    worker ทุกตัวจึงเพิ่มและค้นบน index เดียวกัน และไม่มีใครเขียนไฟล์ทับกัน
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def load(self):
+        size = self.client.call("ltm_info")["size"]
+        print(f"  - 🧠 ความทรงจำระยะยาวพร้อมใช้งานผ่าน Inference Sidecar ({size} บทสนทนา)")
+
+    def add_exchange(self, model_row_id, user_text, model_text, route):
+        from modules.long_term_memory import INDEXED_ROUTE
+        if model_row_id is None or route != INDEXED_ROUTE:
+            return
+        try:
+            self.client.call("ltm_add", model_row_id=int(model_row_id), user_text=user_text, model_text=model_text, route=route)
+        except Exception as e:
+            logger.error(f"❌ [Long-term Memory] ไม่สามารถบันทึกความทรงจำระยะยาวได้: {e}")
+
+    def search(self, query_embedding, k=3, recent_turns=15, min_similarity=0.5):
+        response = self.client.call(
+            "ltm_search", vector=_encode_array(np.asarray(query_embedding, dtype="float32")),
+            k=int(k), recent_turns=int(recent_turns), min_similarity=float(min_similarity),
+        )
+        return [tuple(memory) for memory in response["memories"]]
+
+    def save(self):
+        # sidecar เป็นผู้บันทึก index เอง
+        pass
+
+
+def connect_remote_resources(socket_path):
+    """คืนค่า (embedder, reranker, knowledge_index, knowledge_entries, info) ที่ส่งงานไปยัง sidecar"""
+    client = InferenceClient(socket_path)
+    info = client.info()
+    return RemoteEmbedder(client), RemoteReranker(client), RemoteIndex(client, info), RemoteEntries(client, info), info
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inference sidecar สำหรับ embed/search/rerank")
+    parser.add_argument("--socket", default=os.getenv("INFERENCE_SOCKET", DEFAULT_SOCKET_PATH))
+    parser.add_argument("--index", default="./index")
+    parser.add_argument("--batch-window-ms", type=float, default=5.0)
+    parser.add_argument("--memory-db", default="data/memory.db")
+    args = parser.parse_args()
+
+    configure_logging()
+    inference_server = InferenceServer(args.socket, args.index, args.batch_window_ms, args.memory_db)
+    inference_server.load()
+    asyncio.run(inference_server.serve())
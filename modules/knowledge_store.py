@@ -0,0 +1,61 @@
+# File: modules/knowledge_store.py
+
+import os
+import json
+from typing import Dict, Iterator, Tuple
+
+MAPPING_JSON = "mapping.json"
+MAPPING_JSONL = "mapping.jsonl"
+# ตัวสร้าง Index เขียน mapping ลงไฟล์นี้ก่อน แล้วค่อยสลับแทน mapping.jsonl พร้อมกับ faiss.index เมื่อสร้างเสร็จ
+MAPPING_JSONL_BUILDING = MAPPING_JSONL + ".tmp"
+
+
+def iter_knowledge_entries(index_folder: str = "./index") -> Iterator[Tuple[str, dict]]:
+    """
+    อ่านข้อมูลหนังสือจาก Document Store ทีละรายการ
+
+    รองรับทั้ง mapping.jsonl (แบบ append ทีละบรรทัด จากตัวสร้าง Index แบบ streaming)
+    และ mapping.json แบบเดิม โดยลำดับบรรทัดใน mapping.jsonl คือ ID ใน FAISS index
+    """
+    jsonl_path = os.path.join(index_folder, MAPPING_JSONL)
+    if os.path.exists(jsonl_path):
+        yield from iter_jsonl_entries(jsonl_path)
+        return
+
+    with open(os.path.join(index_folder, MAPPING_JSON), "r", encoding="utf-8") as f:
+        yield from json.load(f).items()
+
+
+def iter_jsonl_entries(path: str) -> Iterator[Tuple[str, dict]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for idx, line in enumerate(f):
+            yield str(idx), json.loads(line)
+
+
+def load_knowledge_entries(index_folder: str = "./index") -> Dict[str, dict]:
+    return dict(iter_knowledge_entries(index_folder))
+
+
+class KnowledgeStoreWriter:
+    """
+    ตัวเขียน mapping.jsonl แบบ append-only ที่จำตำแหน่ง byte ล่าสุดไว้
+    เพื่อให้ checkpoint ย้อนกลับไปตัดข้อมูลส่วนเกินได้เมื่อ resume
+    """
+
+    def __init__(self, index_folder: str, truncate_at: int = 0, filename: str = MAPPING_JSONL):
+        self.path = os.path.join(index_folder, filename)
+        mode = "r+b" if truncate_at and os.path.exists(self.path) else "wb"
+        self._f = open(self.path, mode)
+        self._f.truncate(truncate_at)
+        self._f.seek(truncate_at)
+
+    def append(self, entry: dict) -> None:
+        self._f.write(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def flush(self) -> int:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.tell()
+
+    def close(self) -> None:
+        self._f.close()
@@ -0,0 +1,220 @@
+# File: modules/long_term_memory.py
+
+import os
+import sqlite3
+import threading
+import numpy as np
+import faiss
+from typing import List, Optional, Tuple
+
+from modules.telemetry import get_logger, span
+
+logger = get_logger("long_term_memory")
+
+# เก็บเฉพาะคำตอบจริงจาก Super Advisor ข้อความตอบกลับสำเร็จรูป (คำตอบด่วน, system tools, คิวเต็ม, โควต้าเต็ม,
+# ข้อผิดพลาด ฯลฯ) ไม่ถูกเก็บ เพราะจะถูกดึงกลับไปใส่ prompt เป็น "บทสนทนาเก่าที่เกี่ยวข้อง"
+INDEXED_ROUTE = "super_advisor"
+
+# แถว model ถูกจับคู่กับข้อความ user ที่ตอบ (reply_to) ส่วนแถวเก่าที่ยังไม่มี reply_to ใช้แถวก่อนหน้าที่เป็น user
+_EXCHANGE_QUERY = """
+    SELECT m.id, u.content, m.content FROM conversation_history m
+    JOIN conversation_history u ON u.id = COALESCE(m.reply_to, m.id - 1) AND u.role = 'user'
+    WHERE m.role = 'model' AND m.route = ? AND m.id IN ({placeholders})
+"""
+
+_HISTORY_COLUMNS = {"reply_to": "INTEGER", "route": "TEXT"}
+
+
+def ensure_history_columns(conn) -> bool:
+    """
+    เพิ่มคอลัมน์ reply_to (id ของข้อความ user ที่แถว model ตอบ) และ route (เส้นทางที่ใช้ตอบ)
+    ให้ conversation_history เดิมถ้ายังไม่มี คืนค่า False ถ้ายังไม่มีตาราง conversation_history
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(conversation_history)")}
+    if not columns:
+        return False
+    for name, column_type in _HISTORY_COLUMNS.items():
+        if name not in columns:
+            conn.execute(f"ALTER TABLE conversation_history ADD COLUMN {name} {column_type}")
+    conn.commit()
+    return True
+
+
+def _lock_exclusively(path: str):
+    """ล็อกไฟล์แบบ exclusive โดยไม่รอ คืนค่า file object ที่ต้องเปิดค้างไว้ หรือ None ถ้ามี process อื่นถืออยู่"""
+    lock_file = open(path, "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class LongTermMemory:
+    """
+    ความทรงจำระยะยาว: FAISS index ขนาดเล็กของบทสนทนาเก่าใน memory.db
+
+    แต่ละรายการคือหนึ่งคู่ถาม-ตอบจาก Super Advisor (ข้อความ user + คำตอบ model ที่อ้างถึงด้วย reply_to
+    และมี route เป็น INDEXED_ROUTE) โดยใช้ id ของแถว model
+    ใน conversation_history เป็น id ใน index รายการที่ถูก index แล้วอ่านได้จาก id ใน index เอง
+    การเพิ่มที่เสร็จไม่ตามลำดับจึงไม่ทำให้รายการใดตกหล่น และตอนเริ่มระบบจะ sync แถวที่ยังไม่อยู่ใน index
+
+    index ถูกเขียนทับทั้งไฟล์ตอน save จึงให้ process เดียวเป็นเจ้าของ (ล็อกไฟล์ตอน load)
+    process อื่นที่ล็อกไม่ได้จะเปิด index แบบอ่านอย่างเดียว (ค้นได้ แต่ไม่เพิ่มและไม่บันทึก)
+    เมื่อรันหลาย uvicorn worker ให้ใช้ผ่าน inference sidecar (RemoteLongTermMemory) ทุก worker จึงเพิ่มความทรงจำได้
+    """
+
+    def __init__(self, embedder, db_path='data/memory.db', index_path='data/long_term_memory.index',
+                 save_every=20, max_answer_chars=600):
+        self.embedder = embedder
+        self.db_path = db_path
+        self.index_path = index_path
+        self.save_every = save_every
+        self.max_answer_chars = max_answer_chars
+        self.index = None
+        self._indexed_ids = set()
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._process_lock = None
+        self.read_only = False
+
+    def load(self):
+        if self._process_lock is None and not self.read_only:
+            self._process_lock = _lock_exclusively(self.index_path + ".lock")
+            if self._process_lock is None:
+                self.read_only = True
+                logger.warning(
+                    f"⚠️ [Long-term Memory] '{self.index_path}' ถูกใช้งานโดย process อื่นอยู่: เปิดแบบอ่านอย่างเดียว "
+                    "(ไม่บันทึกความทรงจำใหม่) หากรันหลาย worker ให้เปิด inference sidecar และตั้งค่า INFERENCE_SOCKET"
+                )
+        if os.path.exists(self.index_path):
+            self.index = faiss.read_index(self.index_path)
+            self._indexed_ids = {int(row_id) for row_id in faiss.vector_to_array(self.index.id_map)}
+        size = self.index.ntotal if self.index is not None else 0
+        if self.read_only:
+            print(f"  - 🧠 ความทรงจำระยะยาวพร้อมใช้งานแบบอ่านอย่างเดียว ({size} บทสนทนา)")
+            return
+        added = self.sync()
+        size = self.index.ntotal if self.index is not None else 0
+        print(f"  - 🧠 ความทรงจำระยะยาวพร้อมใช้งาน ({size} บทสนทนา, เพิ่มใหม่ {added})")
+
+    def _exchange_text(self, user_text: str, model_text: str) -> str:
+        return f"user: {user_text}\nmodel: {model_text[:self.max_answer_chars]}"
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.embedder.encode(texts, convert_to_numpy=True), dtype="float32").reshape(len(texts), -1)
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def _add_vectors(self, ids, vectors):
+        with self._lock:
+            keep = [i for i, row_id in enumerate(ids) if row_id not in self._indexed_ids]
+            if not keep:
+                return
+            if self.index is None:
+                self.index = faiss.IndexIDMap(faiss.IndexFlatIP(vectors.shape[1]))
+            new_ids = [ids[i] for i in keep]
+            self.index.add_with_ids(np.ascontiguousarray(vectors[keep]), np.asarray(new_ids, dtype="int64"))
+            self._indexed_ids.update(new_ids)
+            self._unsaved += len(new_ids)
+            should_save = self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def _fetch_exchanges(self, conn, model_row_ids) -> List[Tuple[int, str, str]]:
+        placeholders = ",".join("?" * len(model_row_ids))
+        return conn.execute(_EXCHANGE_QUERY.format(placeholders=placeholders), [INDEXED_ROUTE, *model_row_ids]).fetchall()
+
+    def sync(self, batch_size=128) -> int:
+        """index คู่ถาม-ตอบใน memory.db ที่ยังไม่อยู่ใน index"""
+        if self.read_only:
+            return 0
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if not ensure_history_columns(conn):
+                return 0
+            model_row_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM conversation_history WHERE role = 'model' AND route = ? ORDER BY id", (INDEXED_ROUTE,)
+            )]
+            with self._lock:
+                missing = [row_id for row_id in model_row_ids if row_id not in self._indexed_ids]
+
+            added = 0
+            for start in range(0, len(missing), batch_size):
+                exchanges = self._fetch_exchanges(conn, missing[start:start + batch_size])
+                if not exchanges:
+                    continue
+                texts = [self._exchange_text(user_text, model_text) for _, user_text, model_text in exchanges]
+                self._add_vectors([row_id for row_id, _, _ in exchanges], self._embed(texts))
+                added += len(exchanges)
+        finally:
+            conn.close()
+        if added:
+            self.save()
+        return added
+
+    def add_exchange(self, model_row_id: Optional[int], user_text: str, model_text: str, route: str):
+        """เพิ่มคู่ถาม-ตอบใหม่ (เรียกหลังบันทึกคำตอบพร้อม reply_to และ route ลง memory.db แล้ว) ข้ามถ้า route ไม่ใช่ INDEXED_ROUTE"""
+        if self.read_only or model_row_id is None or route != INDEXED_ROUTE:
+            return
+        with self._lock:
+            if model_row_id in self._indexed_ids:
+                return
+        try:
+            with span("long_term_memory_write"):
+                self._add_vectors([model_row_id], self._embed([self._exchange_text(user_text, model_text)]))
+        except Exception as e:
+            logger.error(f"❌ [Long-term Memory] ไม่สามารถบันทึกความทรงจำระยะยาวได้: {e}")
+
+    def search(self, query_embedding: np.ndarray, k=3, recent_turns=15, min_similarity=0.5) -> List[Tuple[str, str]]:
+        """
+        คืนค่าคู่ (คำถาม, คำตอบ) เก่าที่เกี่ยวข้องกับคำถามมากที่สุด ไม่เกิน k รายการ
+        โดยข้ามบทสนทนาที่ยังอยู่ในความจำระยะสั้น (recent_turns แถวล่าสุด) อยู่แล้ว
+        """
+        if self.index is None or self.index.ntotal == 0:
+            return []
+        with span("long_term_memory_search"):
+            vector = np.asarray(query_embedding, dtype="float32").reshape(1, -1).copy()
+            faiss.normalize_L2(vector)
+            with self._lock:
+                scores, ids = self.index.search(vector, min(k + recent_turns, self.index.ntotal))
+
+            conn = sqlite3.connect(self.db_path)
+            try:
+                window_start = conn.execute(
+                    "SELECT MIN(id) FROM (SELECT id FROM conversation_history ORDER BY id DESC LIMIT ?)", (recent_turns,)
+                ).fetchone()[0] or 0
+                candidates = [
+                    int(row_id) for score, row_id in zip(scores[0], ids[0])
+                    if row_id >= 0 and score >= min_similarity and row_id < window_start
+                ]
+                if not candidates:
+                    return []
+                exchanges = {row_id: (user_text, model_text) for row_id, user_text, model_text in self._fetch_exchanges(conn, candidates)}
+            finally:
+                conn.close()
+
+            memories = []
+            for row_id in candidates:
+                if row_id in exchanges:
+                    user_text, model_text = exchanges[row_id]
+                    memories.append((user_text, model_text[:self.max_answer_chars]))
+                if len(memories) >= k:
+                    break
+            return memories
+
+    def save(self):
+        with self._lock:
+            if self.index is None or self.read_only:
+                return
+            faiss.write_index(self.index, self.index_path + ".tmp")
+            os.replace(self.index_path + ".tmp", self.index_path)
+            self._unsaved = 0
+
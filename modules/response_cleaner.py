@@ -0,0 +1,112 @@
+# File: modules/response_cleaner.py
+
+import re
+
+# ความยาวสูงสุดของเนื้อหาใน tag ที่ถูกลบ: '<' ที่ไม่มี '>' ปิดภายในระยะนี้ไม่ใช่ tag (เช่น "a < b")
+# ทำให้ ResponseCleaner พักข้อความท้ายไว้รอ '>' ได้ไม่เกินระยะนี้
+MAX_TAG_CHARS = 200
+
+# ทุกกฎของ clean_response เดิมรวมเป็น pattern เดียว (ลำดับ alternative มีผลเมื่อหลายกฎเริ่มที่ตำแหน่งเดียวกัน)
+# กลุ่ม *_before_separator เป็น lookahead ว่ามีเส้นคั่น --- ตามมาติดกันหรือไม่ เพราะเส้นคั่นเดิมกิน whitespace
+# ที่อยู่ข้างหน้าด้วย ทำให้ผลลัพธ์ของกฎที่อยู่ติดกันต่างไปจากเมื่ออยู่เดี่ยว ๆ
+_CLEAN_PATTERN = re.compile(
+    r"(?=[<\s*-])"  # ทุกกฎเริ่มด้วยตัวอักษรเหล่านี้: ตัดตำแหน่งอื่นทิ้งก่อนลองทีละ alternative
+    rf"(?:(?P<tag><[^>]{{1,{MAX_TAG_CHARS}}}>)"
+    r"|(?P<separator_bullet>\s*---[^\S\n]*\n\s*(?:\*\s*\*|\*)\s*(?P<separator_bullet_before_separator>(?=---))?)"
+    r"|(?P<separator>\s*---\s*(?P<separator_before_separator>(?=---))?)"
+    r"|(?P<bullet>(?P<line_start>^|\n)\s*(?:\*\s*\*|\*)\s*(?P<bullet_before_separator>(?=---))?)"
+    r"|(?P<star_pair>\*\s*\*)"
+    r"|(?P<newlines>\n{3,}))"
+)
+# ตัวอักษรที่อาจเป็นส่วนหนึ่งของ match ที่ยังไม่จบ (ต้องรอ chunk ถัดไปก่อนตัดสิน)
+_UNSAFE_TAIL_CHARS = frozenset("*-")
+# ตัวอักษรนำหน้าเมื่อประมวลผลส่วนกลางของข้อความ เพื่อไม่ให้ ^ match ที่ต้น chunk
+_CONTEXT_CHAR = "\x00"
+
+
+def _replace(match) -> str:
+    rule = match.lastgroup
+    if rule == "tag":
+        return ""
+    if rule == "separator":
+        # เส้นคั่นที่อยู่ติดกันไม่ทำให้เกิดบรรทัดว่างเกิน 2 บรรทัด
+        return "\n\n---" if match.group("separator_before_separator") is not None else "\n\n---\n\n"
+    if rule == "separator_bullet":
+        # bullet ที่ขึ้นบรรทัดใหม่ต่อจากเส้นคั่นทันที: เส้นคั่นกินการเยื้องของ bullet เหลือแค่ '* '
+        return "\n\n---\n\n*" if match.group("separator_bullet_before_separator") is not None else "\n\n---\n\n* "
+    if rule == "bullet":
+        return match.group("line_start") + ("  *" if match.group("bullet_before_separator") is not None else "  * ")
+    if rule == "star_pair":
+        return "*"
+    return "\n\n"
+
+
+class ResponseCleaner:
+    """
+    ทำความสะอาดคำตอบจาก Gemini ในรอบเดียว ให้ผลเหมือน clean_response แบบ re.sub 5 รอบเดิม:
+    ลบ tag HTML, จัดเส้นคั่น ---, แปลง bullet ต้นบรรทัดเป็น '  * ', รวม ** เป็น *, ยุบบรรทัดว่างเกิน 2 บรรทัด
+    และ strip หัวท้าย
+
+    ใช้กับข้อความที่ stream มาทีละส่วนได้: feed() คืนข้อความที่แน่นอนแล้ว และเก็บส่วนท้ายที่ยังอาจ
+    เป็นส่วนหนึ่งของ pattern ไว้รอ chunk ถัดไป (ไม่สแกนส่วนที่ประมวลผลไปแล้วซ้ำ) ส่วน finish() คืนข้อความที่เหลือ
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._at_start = True
+        self._started = False
+        self._pending_whitespace = ""
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        cut = self._safe_cut(self._buffer)
+        if cut == 0:
+            return ""
+        ready, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return self._process(ready)
+
+    def finish(self) -> str:
+        ready, self._buffer = self._buffer, ""
+        output = self._process(ready) if ready else ""
+        self._pending_whitespace = ""
+        return output
+
+    @staticmethod
+    def _safe_cut(buffer: str) -> int:
+        # ตัดก่อน '<' ที่ยังไม่มี '>' ปิด (อาจเป็น tag ที่ยังมาไม่ครบ) และก่อน whitespace / '*' / '-' ท้ายข้อความ
+        # จุดตัดจึงอยู่หลังตัวอักษรที่ไม่มี pattern ใดข้ามไปได้ และกฎที่อยู่ติดกันถูกประมวลผลในรอบเดียวกันเสมอ
+        # '<' ที่อยู่ห่างจากท้ายเกิน MAX_TAG_CHARS ไม่มีทางเป็น tag แล้ว จึงค้นเฉพาะช่วงท้าย (buffer ไม่โตไม่จำกัด)
+        cut = len(buffer)
+        search_from = max(buffer.rfind(">") + 1, len(buffer) - MAX_TAG_CHARS - 1)
+        open_tag = buffer.find("<", search_from)
+        if open_tag != -1:
+            cut = open_tag
+        while cut > 0 and (buffer[cut - 1] in _UNSAFE_TAIL_CHARS or buffer[cut - 1].isspace()):
+            cut -= 1
+        return cut
+
+    def _process(self, text: str) -> str:
+        if self._at_start:
+            self._at_start = False
+            output = _CLEAN_PATTERN.sub(_replace, text)
+        else:
+            output = _CLEAN_PATTERN.sub(_replace, _CONTEXT_CHAR + text)[1:]
+
+        # whitespace ต้นข้อความถูกตัดทิ้ง ส่วน whitespace ท้ายถูกพักไว้จนกว่าจะมีข้อความตามมา (เท่ากับ strip())
+        if not self._started:
+            output = output.lstrip()
+            if not output:
+                return ""
+            self._started = True
+        content = output.rstrip()
+        if not content:
+            self._pending_whitespace += output
+            return ""
+        output, self._pending_whitespace = self._pending_whitespace + content, output[len(content):]
+        return output
+
+
+def clean_response_text(response_text: str) -> str:
+    cleaner = ResponseCleaner()
+    return cleaner.feed(response_text) + cleaner.finish()
+
@@ -0,0 +1,102 @@
+# File: modules/single_flight.py
+
+import re
+import sqlite3
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from modules.telemetry import get_logger, record_cache, span
+
+logger = get_logger("single_flight")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    return _WHITESPACE_RE.sub(" ", query).strip().lower()
+
+
+def last_model_turn_before(before_id: Optional[int], db_path: str = 'data/memory.db') -> Optional[Tuple[int, str]]:
+    """คืนค่า (id, content) ของคำตอบ model ล่าสุดที่อยู่ก่อนแถว before_id (หรือล่าสุดทั้งหมดถ้าไม่ระบุ) หรือ None ถ้าไม่มี"""
+    with span("memory_io"):
+        conn = sqlite3.connect(db_path)
+        try:
+            if before_id is None:
+                row = conn.execute(
+                    "SELECT id, content FROM conversation_history WHERE role = 'model' ORDER BY id DESC LIMIT 1"
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT id, content FROM conversation_history WHERE role = 'model' AND id < ? ORDER BY id DESC LIMIT 1",
+                    (before_id,),
+                ).fetchone()
+        finally:
+            conn.close()
+    return tuple(row) if row else None
+
+
+def make_advisor_key(query: str, last_model_turn: Optional[Tuple[int, str]], daily_context: dict) -> str:
+    """
+    สร้าง key จากคำถามที่ normalize แล้ว + คำตอบ model ล่าสุดก่อนคำถามนี้ (last_model_turn_before) + วันเวลา
+
+    คำขอที่ซ้ำกันแต่ละตัวบันทึกคำถามของตัวเองลงความจำก่อนเข้ามาถึงขั้นตอนนี้ หน้าต่างประวัติ N แถวล่าสุด
+    ของแต่ละคำขอจึงเลื่อนกันทีละแถว ส่วนคำตอบ model ล่าสุดก่อนแถวคำถามของตัวเองไม่เลื่อนตาม
+    (แถวที่คั่นอยู่มีแต่คำถาม user ที่ยังไม่ได้คำตอบ) คำขอที่ซ้ำกันพร้อมกันจึงได้ key เดียวกัน
+    """
+    digest = hashlib.sha1(normalize_query(query).encode("utf-8"))
+    digest.update(f"|{daily_context.get('full_date')}|{daily_context.get('current_time')}".encode("utf-8"))
+    if last_model_turn is not None:
+        row_id, content = last_model_turn
+        digest.update(f"\x00{row_id}\x01{content}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """
+    รวมคำขอที่มี key เดียวกันซึ่งกำลังทำงานอยู่พร้อมกันให้เหลือการประมวลผลเพียงครั้งเดียว
+    คำขอแรกเป็นผู้รันงานจริง คำขอที่ตามมาจะรอและได้รับผลลัพธ์เดียวกัน
+    ถ้าผู้รันงานจริงถูกยกเลิก คำขอที่รออยู่จะเริ่มใหม่ (คนแรกที่กลับมาเป็นผู้รันงานแทน) แทนที่จะถูกยกเลิกตาม
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, work: Callable[[], Awaitable]):
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            record_cache(self.name, True)
+            logger.info(f"🔗 [Single-flight] รวมคำขอซ้ำเข้ากับงานที่กำลังทำอยู่ ({self.name})")
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if not future.cancelled() or (hasattr(task, "cancelling") and task.cancelling()):
+                    raise
+                # ผู้รันงานจริงถูกยกเลิก (เช่น client ตัดการเชื่อมต่อ) แต่คำขอนี้ยังรอผลอยู่: ลองใหม่และอาจเป็นผู้รันงานเอง
+                logger.info(f"🔁 [Single-flight] งานที่รวมไว้ถูกยกเลิก, ลองใหม่ ({self.name})")
+
+        record_cache(self.name, False)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await work()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # ป้องกันคำเตือน "exception was never retrieved" เมื่อไม่มีผู้รอ
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
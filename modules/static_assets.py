@@ -0,0 +1,71 @@
+# File: modules/static_assets.py
+
+import os
+import hashlib
+from typing import Dict, Tuple
+
+from fastapi.staticfiles import StaticFiles
+
+from modules.telemetry import get_logger
+
+logger = get_logger("static_assets")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def build_manifest(directory: str) -> Dict[str, str]:
+    """คืนค่า {path เดิม: path ที่มี hash ของเนื้อหาในชื่อไฟล์} เช่น static/script.js → static/script.1a2b3c4d5e6f.js"""
+    manifest = {}
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if filename.endswith(".html"):
+                continue
+            full_path = os.path.join(root, filename)
+            relative_path = os.path.relpath(full_path, directory).replace(os.sep, "/")
+            with open(full_path, "rb") as f:
+                digest = _content_hash(f.read())
+            stem, extension = os.path.splitext(relative_path)
+            manifest[relative_path] = f"{stem}.{digest}{extension}"
+    return manifest
+
+
+class HashedStaticFiles(StaticFiles):
+    """
+    StaticFiles ที่เสิร์ฟไฟล์ได้ทั้งชื่อเดิมและชื่อที่มี hash ของเนื้อหา
+    ชื่อที่มี hash ไม่มีวันเปลี่ยนเนื้อหา จึงให้ browser cache ได้ตลอด (immutable)
+    ส่วนชื่อเดิมต้อง revalidate ด้วย ETag ทุกครั้ง (no-cache) manifest ถูกสร้างครั้งเดียวตอนเริ่มระบบ
+    """
+
+    def __init__(self, *, directory: str, mount_path: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.mount_path = mount_path.rstrip("/")
+        self.manifest = build_manifest(directory)
+        self._originals = {hashed: original for original, hashed in self.manifest.items()}
+        logger.info(f"📦 [Static] hashed {len(self.manifest)} assets under {self.mount_path}")
+
+    def asset_url(self, path: str) -> str:
+        return f"{self.mount_path}/{self.manifest.get(path, path)}"
+
+    async def get_response(self, path: str, scope):
+        original = self._originals.get(path.replace(os.sep, "/"))
+        if original is not None:
+            response = await super().get_response(original, scope)
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+            return response
+        response = await super().get_response(path, scope)
+        response.headers.setdefault("Cache-Control", REVALIDATE_CACHE_CONTROL)
+        return response
+
+    def render_page(self, filename: str) -> Tuple[bytes, str]:
+        """อ่านหน้า HTML แล้วเปลี่ยน URL ของ asset เป็นชื่อที่มี hash คืนค่า (เนื้อหา, ETag)"""
+        with open(os.path.join(self.directory, filename), "r", encoding="utf-8") as f:
+            html = f.read()
+        for original in self.manifest:
+            html = html.replace(f'"{self.mount_path}/{original}"', f'"{self.asset_url(original)}"')
+        body = html.encode("utf-8")
+        return body, f'"{_content_hash(body)}"'
@@ -1,56 +1,137 @@
 # File: modules/super_advisor.py (Revised for Logic-Focused Consultation)
 
+import os
 import re
+import functools
+import threading
+from collections import OrderedDict
 
-def handle_super_advisor_query(
-    query, q_lower, persona_block, gemini_model, config, clean_func,
-    user_profile, short_term_memory, daily_context,
-    all_book_titles, all_categories,
-    knowledge_index, knowledge_entries, embedder, generate_context_func
-):
-    """
-    จัดการคำถามทุกรูปแบบในฐานะ "Super Advisor" ที่เน้นการให้คำปรึกษาเชิงตรรกะและเหตุผล
-    """
-    user_name = user_profile.get('name', 'เพื่อน')
+from modules.telemetry import get_logger, span, record_cache
 
-    if "มีหนังสืออะไรบ้าง" in q_lower or "รายชื่อหนังสือ" in q_lower:
-        print("✅ [Super Advisor] Responding with book list (Librarian task).")
-        if not all_book_titles:
-            return "ยังไม่มีข้อมูลหนังสือในระบบครับ"
-        return "ตอนนี้ผมมีข้อมูลหนังสือดังนี้ครับ:\n- " + "\n- ".join(all_book_titles)
+try:
+    from google.api_core.exceptions import ResourceExhausted
+except ImportError:
+    ResourceExhausted = None
 
-    if "มีหมวดหมู่อะไรบ้าง" in q_lower or "หมวดหมู่ทั้งหมด" in q_lower:
-        print("✅ [Super Advisor] Responding with category list (Librarian task).")
-        if not all_categories:
-            return "ยังไม่มีข้อมูลหมวดหมู่ในระบบครับ"
-        return "หมวดหมู่ทั้งหมดที่มีอยู่คือ:\n- " + "\n- ".join(all_categories)
+logger = get_logger("super_advisor")
 
-    print("⏳ [Super Advisor] Searching for deep knowledge (RAG)...")
-    query_embedding = embedder.encode(query, convert_to_tensor=True).cpu().numpy().astype('float32')
-    _, indices = knowledge_index.search(query_embedding.reshape(1, -1), 20)
+
+class QuotaExceededError(Exception):
+    """Gemini ตอบกลับว่าโควต้า API เต็ม (HTTP 429)"""
+
+
+def _is_quota_error(error: Exception) -> bool:
+    if ResourceExhausted is not None and isinstance(error, ResourceExhausted):
+        return True
+    error_text = str(error)
+    return "429" in error_text and "quota" in error_text.lower()
+
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", 20))
+RAG_NUM_FINAL_CONTEXT = int(os.getenv("RAG_NUM_FINAL_CONTEXT", 7))
+RAG_SCORE_THRESHOLD = float(os.getenv("RAG_SCORE_THRESHOLD", 0.2))
+LTM_TOP_K = int(os.getenv("LTM_TOP_K", 3))
+LTM_MIN_SIMILARITY = float(os.getenv("LTM_MIN_SIMILARITY", 0.5))
+
+class QueryEmbeddingCache:
+    """LRU cache ของ embedding คำถาม (preload คำถามที่ถามบ่อยไว้ตอน warm-up) ใช้ร่วมกันหลาย thread ได้"""
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def get(self, query):
+        with self._lock:
+            vector = self._vectors.get(query.strip())
+            if vector is not None:
+                self._vectors.move_to_end(query.strip())
+        record_cache("query_embedding", vector is not None)
+        return vector
+
+    def put(self, query, vector):
+        with self._lock:
+            self._vectors[query.strip()] = vector
+            self._vectors.move_to_end(query.strip())
+            while len(self._vectors) > self.max_size:
+                self._vectors.popitem(last=False)
+
+query_embedding_cache = QueryEmbeddingCache(int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 512)))
+
+def embed_query(query, embedder, cache=None):
+    if cache is not None:
+        # key ของ cache คือคำถามที่ strip แล้ว จึง embed ข้อความเดียวกันเพื่อให้ค่าใน cache ตรงกับ key
+        query = query.strip()
+        query_embedding = cache.get(query)
+        if query_embedding is not None:
+            return query_embedding
+    with span("embedding"):
+        query_embedding = embedder.encode(query, convert_to_numpy=True).astype('float32')
+    if cache is not None:
+        cache.put(query, query_embedding)
+    return query_embedding
+
+def retrieve_book_context(query, knowledge_index, knowledge_entries, embedder, generate_context_func,
+                          top_k=20, num_final_context=7, score_threshold=0.2, query_embedding=None):
+    """
+    ค้นหาข้อมูลจากคลังหนังสือ: embed คำถาม → ค้น FAISS top_k → rerank แล้วคัดเหลือ num_final_context
+    ส่ง query_embedding ที่คำนวณไว้แล้วมาได้เพื่อไม่ต้อง embed ซ้ำ
+    คืนค่า (context_from_books, sources)
+    """
+    if query_embedding is None:
+        query_embedding = embed_query(query, embedder)
+    with span("faiss_search"):
+        _, indices = knowledge_index.search(query_embedding.reshape(1, -1), top_k)
     relevant_keys = [str(idx) for idx in indices[0] if 0 <= idx < len(knowledge_entries)]
-    context_from_books, _ = generate_context_func(relevant_keys, query, num_final_context=7)
+    return generate_context_func(relevant_keys, query, num_final_context=num_final_context, score_threshold=score_threshold)
 
-    short_term_context = "\n".join([f"{role}: {content}" for role, content in short_term_memory])
+def retrieve_book_contexts_batch(queries, knowledge_index, knowledge_entries, embedder, generate_contexts_batch_func,
+                                 top_k=20, num_final_context=7, score_threshold=0.2):
+    """
+    retrieve_book_context สำหรับหลายคำถาม: embed ทุกคำถามในครั้งเดียว → ค้น FAISS ด้วย matrix เดียว
+    → rerank ทุกคู่ในครั้งเดียว คืนค่า list ของ (context_from_books, sources) ตามลำดับของ queries
+    """
+    if not queries:
+        return []
+    with span("embedding_batch"):
+        query_embeddings = embedder.encode(list(queries), convert_to_numpy=True).astype('float32')
+    with span("faiss_search_batch"):
+        _, indices = knowledge_index.search(query_embeddings.reshape(len(queries), -1), top_k)
+    relevant_keys_per_query = [[str(idx) for idx in row if 0 <= idx < len(knowledge_entries)] for row in indices]
+    return generate_contexts_batch_func(
+        relevant_keys_per_query, list(queries), num_final_context=num_final_context, score_threshold=score_threshold
+    )
+
+def build_long_term_section(long_term_memories):
+    if not long_term_memories:
+        return ""
+    past_context = "\n\n".join([f"user: {user_text}\nmodel: {model_text}" for user_text, model_text in long_term_memories])
+    return f"""**1.4 Relevant Past Conversations (Long-term Memory):**
+    <ความทรงจำระยะยาว>
+    {past_context}
+    </ความทรงจำระยะยาว>
 
-    print("🧠 [Super Advisor] Constructing LOGIC-FOCUSED Master Prompt for Gemini...")
-    master_prompt = f"""{persona_block}
+    """
+
+_MASTER_PROMPT_TEMPLATE = """{persona_block}
 
     **[PART 1: CONTEXTUAL DATA - ข้อมูลประกอบการวิเคราะห์]**
 
     **1.1 Daily Context:**
-    - วันนี้คือ: {daily_context['day_of_week_thai']}, {daily_context['full_date']}
-    - เวลาปัจจุบัน: {daily_context['current_time']} น.
+    - วันนี้คือ: {day_of_week_thai}, {full_date}
+    - เวลาปัจจุบัน: {current_time} น.
 
     **1.2 User Profile:**
     - ชื่อ: {user_name}
 
     **1.3 Recent Conversation (Short-term Memory):**
     <ประวัติล่าสุด>
-    {short_term_context if short_term_context else "นี่คือการสนทนาแรก"}
+    {short_term_context}
     </ประวัติล่าสุด>
     
-    **1.4 User's Latest Query:** "{query}"
+    {long_term_section}**{query_section_number} User's Latest Query:** "{query}"
 
     ---
 
@@ -83,14 +164,101 @@ def handle_super_advisor_query(
 
     **คำตอบของคุณ (ในฐานะเฟิง):**
     """
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+@functools.lru_cache(maxsize=8)
+def prepare_prompt_template(persona_block):
+    """
+    แยก master prompt เป็นส่วนข้อความคงที่ (รวม persona_block แล้ว) กับชื่อช่องที่ต้องเติมในแต่ละคำถาม
+    คำนวณครั้งเดียวต่อ persona แล้ว cache ไว้ (เรียกล่วงหน้าได้ตอน warm-up)
+    """
+    parts = _PLACEHOLDER_RE.split(_MASTER_PROMPT_TEMPLATE)
+    literals, names = parts[0::2], parts[1::2]
+    # เท่ากับการ strip() ทั้ง prompt: ส่วนหัวและท้ายเป็นข้อความคงที่ที่ไม่ใช่ whitespace อยู่แล้ว
+    literals = [(persona_block + literals[1]).lstrip()] + literals[2:]
+    literals[-1] = literals[-1].rstrip()
+    return tuple(literals), tuple(names[1:])
+
+def build_master_prompt(query, persona_block, user_name, short_term_memory, daily_context, context_from_books,
+                        long_term_memories=None):
+    short_term_context = "\n".join([f"{role}: {content}" for role, content in short_term_memory])
+    long_term_section = build_long_term_section(long_term_memories)
+
+    logger.debug("🧠 [Super Advisor] Constructing LOGIC-FOCUSED Master Prompt for Gemini...")
+    values = {
+        "day_of_week_thai": daily_context['day_of_week_thai'],
+        "full_date": daily_context['full_date'],
+        "current_time": daily_context['current_time'],
+        "user_name": user_name,
+        "short_term_context": short_term_context if short_term_context else "นี่คือการสนทนาแรก",
+        "long_term_section": long_term_section,
+        "query_section_number": "1.5" if long_term_section else "1.4",
+        "query": query,
+        "context_from_books": context_from_books,
+    }
+    literals, names = prepare_prompt_template(persona_block)
+    pieces = [literals[0]]
+    for name, literal in zip(names, literals[1:]):
+        pieces.append(values[name])
+        pieces.append(literal)
+    return "".join(pieces)
+
+def handle_super_advisor_query(
+    query, q_lower, persona_block, gemini_model, config, clean_func,
+    user_profile, short_term_memory, daily_context,
+    all_book_titles, all_categories,
+    knowledge_index, knowledge_entries, embedder, generate_context_func,
+    long_term_memory=None
+):
+    """
+    จัดการคำถามทุกรูปแบบในฐานะ "Super Advisor" ที่เน้นการให้คำปรึกษาเชิงตรรกะและเหตุผล
+    """
+    user_name = user_profile.get('name', 'เพื่อน')
+
+    if "มีหนังสืออะไรบ้าง" in q_lower or "รายชื่อหนังสือ" in q_lower:
+        logger.info("✅ [Super Advisor] Responding with book list (Librarian task).")
+        if not all_book_titles:
+            return "ยังไม่มีข้อมูลหนังสือในระบบครับ"
+        return "ตอนนี้ผมมีข้อมูลหนังสือดังนี้ครับ:\n- " + "\n- ".join(all_book_titles)
+
+    if "มีหมวดหมู่อะไรบ้าง" in q_lower or "หมวดหมู่ทั้งหมด" in q_lower:
+        logger.info("✅ [Super Advisor] Responding with category list (Librarian task).")
+        if not all_categories:
+            return "ยังไม่มีข้อมูลหมวดหมู่ในระบบครับ"
+        return "หมวดหมู่ทั้งหมดที่มีอยู่คือ:\n- " + "\n- ".join(all_categories)
+
+    logger.info("⏳ [Super Advisor] Searching for deep knowledge (RAG)...")
+    query_embedding = embed_query(query, embedder, cache=query_embedding_cache)
+    context_from_books, _ = retrieve_book_context(
+        query, knowledge_index, knowledge_entries, embedder, generate_context_func,
+        top_k=RAG_TOP_K, num_final_context=RAG_NUM_FINAL_CONTEXT, score_threshold=RAG_SCORE_THRESHOLD,
+        query_embedding=query_embedding
+    )
+
+    long_term_memories = []
+    if long_term_memory is not None:
+        # ใช้ embedding ของคำถามตัวเดียวกับที่ค้นคลังหนังสือ
+        long_term_memories = long_term_memory.search(
+            query_embedding, k=LTM_TOP_K, recent_turns=len(short_term_memory), min_similarity=LTM_MIN_SIMILARITY
+        )
+        if long_term_memories:
+            logger.info(f"🧠 [Super Advisor] พบบทสนทนาเก่าที่เกี่ยวข้อง {len(long_term_memories)} รายการ")
+
+    with span("prompt_build"):
+        master_prompt = build_master_prompt(
+            query, persona_block, user_name, short_term_memory, daily_context, context_from_books,
+            long_term_memories=long_term_memories
+        )
+    return generate_advisor_answer(master_prompt, gemini_model, config, clean_func)
 
+def generate_advisor_answer(master_prompt, gemini_model, config, clean_func):
+    """ส่ง prompt ให้ Gemini แล้วคืนคำตอบที่ทำความสะอาดแล้ว (None ถ้าล้มเหลว, raise QuotaExceededError ถ้าโควต้าเต็ม)"""
     try:
-        response = gemini_model.generate_content(master_prompt.strip(), generation_config=config)
+        with span("gemini"):
+            response = gemini_model.generate_content(master_prompt, generation_config=config)
         return clean_func(response.text)
     except Exception as e:
-        error_text = str(e)
-        if "429" in error_text and "quota" in error_text:
-            return f"ขออภัยครับคุณ{user_name}, ตอนนี้โควต้า API ของผมเต็มแล้ว โปรดลองอีกครั้งในภายหลัง"
-        else:
-            print(f"❌ [ERROR] Super Advisor failed in Gemini API: {error_text}")
-            return None
\ No newline at end of file
+        if _is_quota_error(e):
+            raise QuotaExceededError(str(e)) from e
+        logger.error(f"❌ [ERROR] Super Advisor failed in Gemini API: {e}")
+        return None
\ No newline at end of file
@@ -2,12 +2,19 @@
 
 import pyperclip
 import os
+import asyncio
+import functools
 import subprocess
 import platform
 import webbrowser
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
+from modules.telemetry import get_logger
+
+logger = get_logger("system_tools")
+
 current_os = platform.system().lower()
 if current_os == 'windows':
     try:
@@ -21,24 +28,166 @@ else:
     AudioUtilities = None
     print(f"[System Tools] Running on {current_os}. Windows-specific features (pycaw) are disabled.")
 
-def _read_clipboard():
+SYSTEM_TOOLS_BACKEND = os.getenv("SYSTEM_TOOLS_BACKEND", "native").lower()
+TOOL_TIMEOUT_SECONDS = float(os.getenv("SYSTEM_TOOLS_TIMEOUT", 3))
+TOOL_THREADS = int(os.getenv("SYSTEM_TOOLS_THREADS", 2))
+
+# thread pool แยกสำหรับการเรียกที่ block (pycaw, pyperclip, webbrowser): เมื่อหมดเวลาเราเลิกรอได้แต่หยุด thread ไม่ได้
+# การเรียกที่ค้างจึงกินได้แค่ thread ของ pool นี้ ไม่แย่ง default executor ที่งาน RAG (asyncio.to_thread) ใช้อยู่
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_THREADS, thread_name_prefix="system_tools")
+
+
+class ToolTimeout(Exception):
+    """คำสั่งของระบบไม่ตอบสนองภายในเวลาที่กำหนด"""
+
+
+async def _run_command(args, timeout: float = TOOL_TIMEOUT_SECONDS) -> str:
+    """รันคำสั่งแบบ async และคืนค่า stdout ถ้าเกิน timeout จะ kill process แล้ว raise ToolTimeout"""
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise ToolTimeout(f"{args[0]} did not respond within {timeout:.1f}s")
+    return stdout.decode(errors="replace")
+
+
+async def _run_blocking(func, *args, timeout: float = TOOL_TIMEOUT_SECONDS):
+    """เรียกฟังก์ชันที่ block (pycaw, pyperclip, webbrowser) ใน thread pool ของ system tools พร้อม timeout"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(_tool_executor, functools.partial(func, *args)), timeout)
+    except asyncio.TimeoutError:
+        raise ToolTimeout(f"{getattr(func, '__name__', func)} did not respond within {timeout:.1f}s")
+
+
+def _windows_volume_interface():
+    devices = AudioUtilities.GetSpeakers()
+    interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
+    return interface.QueryInterface(IAudioEndpointVolume)
+
+
+def _windows_change_volume(delta: Optional[int], level: Optional[int]) -> int:
+    # อ่านและตั้งค่าในการเรียก COM ครั้งเดียว
+    volume = _windows_volume_interface()
+    if level is None:
+        level = max(0, min(100, round(volume.GetMasterVolumeLevelScalar() * 100) + delta))
+    volume.SetMasterVolumeLevelScalar(level / 100.0, None)
+    return level
+
+
+def _parse_amixer_level(output: str) -> Optional[int]:
+    match = re.search(r"\[(\d{1,3})%\]", output)
+    return int(match.group(1)) if match else None
+
+
+class NativeBackend:
+    """สั่งงานระบบปฏิบัติการจริง (pycaw บน Windows, osascript บน macOS, amixer บน Linux)"""
+
+    name = "native"
+
+    async def set_volume(self, level: int) -> Optional[int]:
+        return await self._apply_volume(level=level)
+
+    async def change_volume(self, delta: int) -> Optional[int]:
+        """เพิ่ม/ลดเสียงด้วยคำสั่งเดียว (ไม่ต้องอ่านค่าก่อนแล้วค่อยตั้งค่า) และคืนค่าระดับเสียงใหม่"""
+        return await self._apply_volume(delta=delta)
+
+    async def _apply_volume(self, delta: Optional[int] = None, level: Optional[int] = None) -> Optional[int]:
+        if current_os == 'windows':
+            if not AudioUtilities: raise NotImplementedError("Volume control disabled (pycaw missing).")
+            return await _run_blocking(_windows_change_volume, delta, level)
+        elif current_os == 'darwin':
+            target = str(level) if level is not None else f"(output volume of (get volume settings)) + ({delta})"
+            output = await _run_command([
+                'osascript',
+                '-e', f'set v to {target}',
+                '-e', 'if v > 100 then set v to 100',
+                '-e', 'if v < 0 then set v to 0',
+                '-e', 'set volume output volume v',
+                '-e', 'return v',
+            ])
+            return int(output.strip())
+        elif current_os == 'linux':
+            if level is not None:
+                amount = f"{level}%"
+            else:
+                amount = f"{abs(delta)}%{'+' if delta >= 0 else '-'}"
+            return _parse_amixer_level(await _run_command(['amixer', '-D', 'pulse', 'sset', 'Master', amount]))
+        raise NotImplementedError(f"Volume control is not supported on {current_os}.")
+
+    async def launch(self, command: str) -> None:
+        # Popen ไม่รอให้โปรแกรมทำงานเสร็จ แต่ fork/exec อาจช้าได้จึงเรียกใน thread
+        await _run_blocking(lambda: subprocess.Popen(command, shell=True))
+
+    async def open_url(self, url: str) -> None:
+        await _run_blocking(webbrowser.open_new_tab, url)
+
+    async def read_clipboard(self) -> str:
+        return await _run_blocking(pyperclip.paste)
+
+    async def write_clipboard(self, text: str) -> None:
+        await _run_blocking(pyperclip.copy, text)
+
+
+class DryRunBackend:
+    """
+    backend จำลองสำหรับทดสอบบนเครื่อง Linux ที่ไม่มีจอ/เสียง (SYSTEM_TOOLS_BACKEND=dryrun)
+    บันทึกคำสั่งที่จะถูกรันลง log และเก็บสถานะเสียง/คลิปบอร์ดไว้ในหน่วยความจำ
+    """
+
+    name = "dryrun"
+
+    def __init__(self):
+        self.volume = 50
+        self.clipboard = ""
+
+    async def set_volume(self, level: int) -> Optional[int]:
+        self.volume = level
+        logger.info(f"[System Tools][dry-run] set volume {level}%")
+        return self.volume
+
+    async def change_volume(self, delta: int) -> Optional[int]:
+        return await self.set_volume(max(0, min(100, self.volume + delta)))
+
+    async def launch(self, command: str) -> None:
+        logger.info(f"[System Tools][dry-run] launch: {command}")
+
+    async def open_url(self, url: str) -> None:
+        logger.info(f"[System Tools][dry-run] open url: {url}")
+
+    async def read_clipboard(self) -> str:
+        return self.clipboard
+
+    async def write_clipboard(self, text: str) -> None:
+        self.clipboard = text
+
+
+backend = DryRunBackend() if SYSTEM_TOOLS_BACKEND == "dryrun" else NativeBackend()
+if backend.name == "dryrun":
+    print("[System Tools] Dry-run backend enabled. No system commands will be executed.")
+
+async def _read_clipboard():
     try:
-        content = pyperclip.paste()
+        content = await backend.read_clipboard()
         return f"ข้อความในคลิปบอร์ดคือ:\n---\n{content}\n---" if content else "ในคลิปบอร์ดไม่มีข้อความอยู่ครับ"
     except Exception as e:
-        print(f"เกิดข้อผิดพลาดในการอ่านคลิปบอร์ด: {e}")
+        logger.error(f"เกิดข้อผิดพลาดในการอ่านคลิปบอร์ด: {e}")
         return "ขออภัยครับ เกิดข้อผิดพลาดบางอย่างในการเข้าถึงคลิปบอร์ด"
 
-def _write_to_clipboard(text: str):
+async def _write_to_clipboard(text: str):
     if not isinstance(text, str): return "ข้อมูลที่ส่งมาไม่ใช่ข้อความครับ"
     try:
-        pyperclip.copy(text)
+        await backend.write_clipboard(text)
         return "เรียบร้อยครับ! ข้อความถูกคัดลอกไปยังคลิปบอร์ดแล้ว"
     except Exception as e:
-        print(f"เกิดข้อผิดพลาดในการเขียนลงคลิปบอร์ด: {e}")
+        logger.error(f"เกิดข้อผิดพลาดในการเขียนลงคลิปบอร์ด: {e}")
         return "ขออภัยครับ เกิดข้อผิดพลาดบางอย่างในการเขียนลงคลิปบอร์ด"
 
-def _open_application(app_name: str) -> str:
+async def _open_application(app_name: str) -> str:
     app_name_lower = app_name.lower().strip()
     command = ""
     thai_to_eng_app = {
@@ -69,14 +218,14 @@ def _open_application(app_name: str) -> str:
     if not command:
         return f"ขออภัยครับ ผมไม่รู้จักวิธีเปิด '{app_name}' บนระบบปฏิบัติการของคุณ ({current_os})"
     try:
-        print(f"[System Tools] Executing command: {command}")
-        subprocess.Popen(command, shell=True)
+        logger.info(f"[System Tools] Executing command: {command}")
+        await backend.launch(command)
         return f"กำลังเปิด {app_name} ให้ครับ..."
     except Exception as e:
-        print(f"เกิดข้อผิดพลาดในการเปิดแอปพลิเคชัน: {e}")
+        logger.error(f"เกิดข้อผิดพลาดในการเปิดแอปพลิเคชัน: {e}")
         return f"ขออภัยครับ เกิดข้อผิดพลาดบางอย่างขณะพยายามเปิด {app_name}"
 
-def _open_website(site_name: str) -> str:
+async def _open_website(site_name: str) -> str:
     site_map = {
         'youtube': 'https://www.youtube.com', 'facebook': 'https://www.facebook.com',
         'google': 'https://www.google.com', 'gmail': 'https://mail.google.com',
@@ -86,74 +235,50 @@ def _open_website(site_name: str) -> str:
     if not url:
         return f"ขออภัยครับ ผมไม่รู้จักเว็บไซต์ '{site_name}'"
     try:
-        print(f"[System Tools] Opening website: {url}")
-        webbrowser.open_new_tab(url)
+        logger.info(f"[System Tools] Opening website: {url}")
+        await backend.open_url(url)
         return f"กำลังเปิด {site_name.capitalize()} ให้ในเบราว์เซอร์ครับ"
     except Exception as e:
-        print(f"เกิดข้อผิดพลาดในการเปิดเว็บไซต์: {e}")
+        logger.error(f"เกิดข้อผิดพลาดในการเปิดเว็บไซต์: {e}")
         return f"ขออภัยครับ เกิดข้อผิดพลาดขณะพยายามเปิด {site_name}"
 
-def _set_system_volume(level: int) -> str:
+async def _set_system_volume(level: int) -> str:
     if not 0 <= level <= 100:
         return "โปรดระบุระดับเสียงระหว่าง 0 ถึง 100 ครับ"
-    print(f"[System Tools] Setting volume to {level}% on {current_os}")
+    logger.info(f"[System Tools] Setting volume to {level}% on {current_os}")
     try:
-        if current_os == 'windows':
-            if not AudioUtilities: raise NotImplementedError("Volume control disabled (pycaw missing).")
-            devices = AudioUtilities.GetSpeakers()
-            interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
-            volume = interface.QueryInterface(IAudioEndpointVolume)
-            volume.SetMasterVolumeLevelScalar(level / 100.0, None)
-        elif current_os == 'darwin':
-            subprocess.run(['osascript', '-e', f'set volume output volume {level}'])
-        elif current_os == 'linux':
-            subprocess.run(['amixer', '-D', 'pulse', 'sset', 'Master', f'{level}%'])
+        await backend.set_volume(level)
         return f"ปรับระดับเสียงเป็น {level}% แล้วครับ"
+    except ToolTimeout as e:
+        logger.error(f"⏱️ [System Tools] {e}")
+        return "ขออภัยครับ ระบบเสียงไม่ตอบสนอง โปรดลองอีกครั้งครับ"
     except Exception as e:
-        print(f"เกิดข้อผิดพลาดในการปรับระดับเสียง: {e}")
+        logger.error(f"เกิดข้อผิดพลาดในการปรับระดับเสียง: {e}")
         return f"ขออภัยครับ เกิดข้อผิดพลาดขณะพยายามปรับระดับเสียงบน {current_os}"
 
-def _get_current_volume() -> Optional[int]:
+async def _change_volume(direction: str, amount: int = 10) -> str:
+    if direction not in ("increase", "decrease"):
+        return "ขออภัยครับ ไม่รู้จักทิศทางการปรับเสียงนั้น"
+    delta = amount if direction == "increase" else -amount
     try:
-        if current_os == 'windows':
-            if not AudioUtilities: return None
-            devices = AudioUtilities.GetSpeakers()
-            interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
-            volume = interface.QueryInterface(IAudioEndpointVolume)
-            return round(volume.GetMasterVolumeLevelScalar() * 100)
-        elif current_os == 'darwin':
-            result = subprocess.run(['osascript', '-e', 'output volume of (get volume settings)'], capture_output=True, text=True)
-            return int(result.stdout.strip())
-        elif current_os == 'linux':
-            result = subprocess.run(['amixer', '-D', 'pulse', 'sget', 'Master'], capture_output=True, text=True)
-            match = re.search(r"\[(\d{1,3})%\]", result.stdout)
-            if match: return int(match.group(1))
-        return None
+        new_level = await backend.change_volume(delta)
+    except ToolTimeout as e:
+        logger.error(f"⏱️ [System Tools] {e}")
+        return "ขออภัยครับ ระบบเสียงไม่ตอบสนอง โปรดลองอีกครั้งครับ"
     except Exception as e:
-        print(f"❌ [System Tools] Error getting current volume: {e}")
-        return None
-
-def _change_volume(direction: str, amount: int = 10) -> str:
-    current_level = _get_current_volume()
-    if current_level is None:
+        logger.error(f"เกิดข้อผิดพลาดในการปรับระดับเสียง: {e}")
+        return f"ขออภัยครับ เกิดข้อผิดพลาดขณะพยายามปรับระดับเสียงบน {current_os}"
+    if new_level is None:
         return "ขออภัยครับ ผมไม่สามารถตรวจสอบระดับเสียงปัจจุบันได้"
-        
-    if direction == "increase":
-        new_level = min(current_level + amount, 100)
-        print(f"🔊 Increasing volume from {current_level}% to {new_level}%")
-        return _set_system_volume(new_level)
-    elif direction == "decrease":
-        new_level = max(current_level - amount, 0)
-        print(f"🔉 Decreasing volume from {current_level}% to {new_level}%")
-        return _set_system_volume(new_level)
-    else:
-        return "ขออภัยครับ ไม่รู้จักทิศทางการปรับเสียงนั้น"
+    icon = "🔊" if delta > 0 else "🔉"
+    logger.info(f"{icon} Volume {'increased' if delta > 0 else 'decreased'} to {new_level}%")
+    return f"ปรับระดับเสียงเป็น {new_level}% แล้วครับ"
 
 # ==============================================================================
 # Public Handler Function (ฟังก์ชันหลักสำหรับเรียกจาก main.py)
 # ==============================================================================
 
-def handle_system_tool_query(query: str) -> Optional[str]:
+async def handle_system_tool_query(query: str) -> Optional[str]:
     """
     ตรวจสอบ query และเรียกใช้ฟังก์ชันเครื่องมือที่เหมาะสม
     คืนค่าเป็น string คำตอบถ้าตรงกับเครื่องมือ, คืนค่า None ถ้าไม่ตรง
@@ -163,13 +288,13 @@ def handle_system_tool_query(query: str) -> Optional[str]:
     # --- Volume Control ---
     set_volume_match = re.search(r"(ปรับ|ตั้งค่า)\s*เสียง\s*(?:เป็น|ไปที่)?\s*(\d{1,3})", q_lower)
     if set_volume_match:
-        return _set_system_volume(int(set_volume_match.group(2)))
+        return await _set_system_volume(int(set_volume_match.group(2)))
     
     if "เพิ่มเสียง" in q_lower:
-        return _change_volume("increase")
+        return await _change_volume("increase")
     
     if "ลดเสียง" in q_lower:
-        return _change_volume("decrease")
+        return await _change_volume("decrease")
 
     # --- Application & Website Control ---
     # รองรับชื่อแอปภาษาไทยและอังกฤษ
@@ -177,21 +302,21 @@ def handle_system_tool_query(query: str) -> Optional[str]:
     if open_app_match:
         entity_name = open_app_match.group(2)
         if entity_name in ['youtube', 'facebook', 'google', 'gmail', 'github']:
-            return _open_website(entity_name)
+            return await _open_website(entity_name)
         else:
-            return _open_application(entity_name)
+            return await _open_application(entity_name)
     
     open_site_match = re.search(r"เปิดเว็บ\s+(.+)", q_lower)
     if open_site_match:
-        return _open_website(open_site_match.group(1))
+        return await _open_website(open_site_match.group(1))
 
     # --- Clipboard Control ---
     write_clip_match = re.search(r"(คัดลอก|copy)\s*(ข้อความ)?\s*['\"](.+)['\"]", query, re.IGNORECASE)
     if write_clip_match:
-        return _write_to_clipboard(write_clip_match.group(3))
+        return await _write_to_clipboard(write_clip_match.group(3))
         
     if "อ่านคลิปบอร์ด" in q_lower or "ในคลิปบอร์ดมีอะไร" in q_lower:
-        return _read_clipboard()
+        return await _read_clipboard()
 
     # ถ้าไม่มีคำสั่งใดตรงกับเงื่อนไข
     return None
\ No newline at end of file
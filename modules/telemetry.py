@@ -0,0 +1,104 @@
+# File: modules/telemetry.py
+
+import os
+import time
+import uuid
+import logging
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+_request_id = contextvars.ContextVar("request_id", default="-")
+
+STAGE_LATENCY = Histogram(
+    "consultant_stage_latency_seconds",
+    "เวลาที่ใช้ในแต่ละขั้นตอนของการตอบคำถาม",
+    ["stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+STAGE_ERRORS = Counter("consultant_stage_errors_total", "จำนวนครั้งที่ขั้นตอนเกิด exception", ["stage"])
+REQUESTS = Counter("consultant_requests_total", "จำนวนคำขอแยกตามเส้นทางที่ใช้ตอบ", ["route"])
+REQUEST_LATENCY = Histogram(
+    "consultant_request_latency_seconds",
+    "เวลาทั้งหมดของคำขอแยกตามเส้นทางที่ใช้ตอบ",
+    ["route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+CACHE_EVENTS = Counter("consultant_cache_events_total", "จำนวน hit/miss ของ cache แต่ละตัว", ["cache", "result"])
+LANE_QUEUE_DEPTH = Gauge("consultant_lane_queue_depth", "จำนวนคำขอที่รอคิวในแต่ละ lane", ["lane"])
+LANE_IN_FLIGHT = Gauge("consultant_lane_in_flight", "จำนวนคำขอที่กำลังทำงานในแต่ละ lane", ["lane"])
+LANE_REJECTIONS = Counter("consultant_lane_rejections_total", "จำนวนคำขอที่ถูกปฏิเสธ (load shedding)", ["lane", "reason"])
+LANE_WAIT = Histogram(
+    "consultant_lane_wait_seconds",
+    "เวลาที่คำขอรอคิวก่อนได้เข้าทำงาน",
+    ["lane"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+def configure_logging() -> None:
+    """ตั้งค่า root logger ตาม LOG_LEVEL เรียกจาก entry point (server / sidecar) เท่านั้น ไม่ใช่ตอน import"""
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+    )
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+logger = get_logger("telemetry")
+
+
+def new_request_id() -> str:
+    request_id = uuid.uuid4().hex[:12]
+    _request_id.set(request_id)
+    return request_id
+
+
+def current_request_id() -> str:
+    return _request_id.get()
+
+
+@contextmanager
+def span(stage: str):
+    """จับเวลาหนึ่งขั้นตอน (routing, embedding, faiss_search, rerank, gemini ฯลฯ) และส่งเข้า histogram"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage).observe(elapsed)
+        logger.debug("request=%s stage=%s duration_ms=%.2f", current_request_id(), stage, elapsed * 1000)
+
+
+def record_request(route: str, elapsed: float) -> None:
+    REQUESTS.labels(route).inc()
+    REQUEST_LATENCY.labels(route).observe(elapsed)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_EVENTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_lane_state(lane: str, queued: int, in_flight: int) -> None:
+    LANE_QUEUE_DEPTH.labels(lane).set(queued)
+    LANE_IN_FLIGHT.labels(lane).set(in_flight)
+
+
+def record_lane_wait(lane: str, elapsed: float) -> None:
+    LANE_WAIT.labels(lane).observe(elapsed)
+
+
+def record_lane_rejection(lane: str, reason: str) -> None:
+    LANE_REJECTIONS.labels(lane, reason).inc()
+
+
+def render_metrics():
+    """คืนค่า (body, content_type) สำหรับ endpoint /metrics ในรูปแบบที่ Prometheus อ่านได้"""
+    return generate_latest(), CONTENT_TYPE_LATEST
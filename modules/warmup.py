@@ -0,0 +1,92 @@
+# File: modules/warmup.py
+
+import os
+import time
+import sqlite3
+from typing import List
+
+from modules.telemetry import get_logger, span
+from modules.super_advisor import (
+    retrieve_book_context, prepare_prompt_template, query_embedding_cache,
+    RAG_TOP_K, RAG_NUM_FINAL_CONTEXT, RAG_SCORE_THRESHOLD,
+)
+
+logger = get_logger("warmup")
+
+WARMUP_TOP_QUERIES = int(os.getenv("WARMUP_TOP_QUERIES", 50))
+
+# คำถามตัวอย่างหลายความยาวสำหรับกระตุ้น embedder / reranker ให้เตรียม kernel ไว้ก่อนคำถามจริง
+WARMUP_QUERIES = [
+    "สวัสดี",
+    "ควรบริหารเวลาอย่างไรให้มีประสิทธิภาพ",
+    "ถ้าต้องตัดสินใจเลือกระหว่างงานที่มั่นคงกับการเริ่มธุรกิจของตัวเอง ควรพิจารณาปัจจัยอะไรบ้าง และมีหลักคิดจากหนังสือเล่มไหนที่ช่วยได้",
+]
+
+
+def load_frequent_queries(db_path='data/memory.db', limit=50, min_count=2) -> List[str]:
+    """คำถามของผู้ใช้ที่ถูกถามซ้ำบ่อยที่สุดจาก memory.db (เรียงจากบ่อยไปน้อย)"""
+    if limit <= 0 or not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT TRIM(content) AS query, COUNT(*) AS hits FROM conversation_history "
+            "WHERE role = 'user' GROUP BY query HAVING hits >= ? ORDER BY hits DESC, MAX(id) DESC LIMIT ?",
+            (min_count, limit),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [query for query, _ in rows if query]
+
+
+def _timed(stage: str, timings: dict, func, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        with span(f"warmup_{stage}"):
+            return func(*args, **kwargs)
+    except Exception as e:
+        # warm-up เป็นแค่การเตรียมล่วงหน้า ถ้าขั้นตอนใดล้มเหลวระบบยังต้องเริ่มทำงานได้ตามปกติ
+        logger.warning(f"⚠️ [Warm-up] {stage} failed: {e}")
+        return None
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def _search_all(knowledge_index, embedder):
+    # faiss.read_index โหลด index ทั้งก้อนเข้าหน่วยความจำอยู่แล้ว การค้นนี้แค่ให้ thread pool และ kernel ของการค้นถูกเตรียมไว้ก่อนคำขอแรก
+    if not getattr(knowledge_index, "ntotal", 0):
+        return None
+    vectors = embedder.encode(WARMUP_QUERIES, convert_to_numpy=True).astype('float32')
+    return knowledge_index.search(vectors, min(RAG_TOP_K, knowledge_index.ntotal))
+
+
+def _preload_frequent_queries(embedder, db_path, limit):
+    queries = load_frequent_queries(db_path, limit=limit)
+    if not queries:
+        return 0
+    vectors = embedder.encode(queries, convert_to_numpy=True).astype('float32')
+    for query, vector in zip(queries, vectors):
+        query_embedding_cache.put(query, vector)
+    return len(queries)
+
+
+def run_warm_up(embedder, reranker, knowledge_index, knowledge_entries, generate_context_func, persona_block,
+                db_path='data/memory.db', top_queries=WARMUP_TOP_QUERIES) -> dict:
+    """
+    ทำงานที่มีต้นทุนครั้งแรกให้เสร็จก่อนเปิดรับคำขอ: embed / ค้น FAISS / rerank ด้วยคำถามตัวอย่าง,
+    เตรียม template ของ master prompt, และ preload embedding ของคำถามที่ถูกถามบ่อยเข้า query_embedding_cache
+    คืนค่าเวลาที่ใช้ในแต่ละขั้นตอน (ms)
+    """
+    timings = {}
+    _timed("embed", timings, embedder.encode, WARMUP_QUERIES[0], convert_to_numpy=True)
+    _timed("search", timings, _search_all, knowledge_index, embedder)
+    _timed("rerank", timings, reranker.predict, [[query, query] for query in WARMUP_QUERIES])
+    _timed(
+        "rag_pipeline", timings, retrieve_book_context,
+        WARMUP_QUERIES[-1], knowledge_index, knowledge_entries, embedder, generate_context_func,
+        top_k=RAG_TOP_K, num_final_context=RAG_NUM_FINAL_CONTEXT, score_threshold=RAG_SCORE_THRESHOLD,
+    )
+    _timed("prompt_template", timings, prepare_prompt_template, persona_block)
+    preloaded = _timed("frequent_queries", timings, _preload_frequent_queries, embedder, db_path, top_queries)
+    print(f"  - 🔥 Warm-up เสร็จสิ้น (preload คำถามที่ถามบ่อย {preloaded or 0} คำถาม) {timings}")
+    return timings
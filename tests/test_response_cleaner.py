@@ -0,0 +1,77 @@
+# File: tests/test_response_cleaner.py
+#
+# รัน: python -m pytest tests/test_response_cleaner.py
+
+import re
+import random
+
+import pytest
+
+from modules.response_cleaner import ResponseCleaner, clean_response_text, MAX_TAG_CHARS
+
+
+def _legacy_clean_response(response_text):
+    """clean_response แบบ re.sub 5 รอบเดิม (ใช้เป็นผลอ้างอิง)"""
+    response_text = re.sub(r'\*\s*\*', '*', response_text)
+    response_text = re.sub(r'(^|\n)\s*\*\s*', r'\1  * ', response_text)
+    response_text = re.sub(r'\s*---\s*', '\n\n---\n\n', response_text)
+    response_text = re.sub(r'\n{3,}', '\n\n', response_text)
+    response_text = re.sub(r'<[^>]+>', '', response_text)
+    return response_text.strip()
+
+
+def _clean_streamed(text, rng, max_step=6):
+    cleaner, pieces, position = ResponseCleaner(), [], 0
+    while position < len(text):
+        step = rng.randint(1, max_step)
+        pieces.append(cleaner.feed(text[position:position + step]))
+        position += step
+    pieces.append(cleaner.finish())
+    return "".join(pieces)
+
+
+GOLDEN_CASES = [
+    ("**หลักการสำคัญ**\nข้อความอธิบาย", "* หลักการสำคัญ*\nข้อความอธิบาย"),
+    ("ข้อดี:\n* ประหยัดเวลา\n* ลดต้นทุน", "ข้อดี:\n  * ประหยัดเวลา\n  * ลดต้นทุน"),
+    ("ส่วนแรก\n---\nส่วนที่สอง", "ส่วนแรก\n\n---\n\nส่วนที่สอง"),
+    ("ย่อหน้า\n\n\n\n\nย่อหน้าถัดไป", "ย่อหน้า\n\nย่อหน้าถัดไป"),
+    ("<b>ตัวหนา</b> และ <br>ขึ้นบรรทัด", "ตัวหนา และ ขึ้นบรรทัด"),
+    ("คำว่า **สำคัญ** ในประโยค", "คำว่า *สำคัญ* ในประโยค"),
+    ("* ---", "*\n\n---"),
+    ("--- ---", "---\n\n---"),
+    ("a\n<br>\n\nb", "a\n\n\nb"),
+    ("  \n\n  คำตอบ  \n\n", "คำตอบ"),
+    ("a < b และ c > d", "a  d"),
+    ("สรุป:\n\n* ข้อ 1\n*ข้อ 2\n\n---\n\n**หมายเหตุ**", "สรุป:\n  * ข้อ 1\n  * ข้อ 2\n\n---\n\n* หมายเหตุ*"),
+]
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN_CASES)
+def test_golden_cases(text, expected):
+    assert clean_response_text(text) == expected
+    assert _legacy_clean_response(text) == expected
+
+
+def test_matches_legacy_on_random_input():
+    rng = random.Random(0)
+    alphabet = ["*", "*", " ", "\n", "\n", "-", "-", "<", ">", "ก", "a", "\t"]
+    for _ in range(20000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        expected = _legacy_clean_response(text)
+        assert clean_response_text(text) == expected, repr(text)
+        assert _clean_streamed(text, rng) == expected, repr(text)
+
+
+def test_unclosed_angle_bracket_is_not_held_back():
+    cleaner = ResponseCleaner()
+    released = cleaner.feed("a < b" + " คำอธิบาย" * (MAX_TAG_CHARS // 4))
+    assert released.startswith("a < b")
+    assert len(cleaner._buffer) <= MAX_TAG_CHARS + 1
+
+
+def test_streaming_matches_one_shot_on_long_input():
+    rng = random.Random(1)
+    alphabet = ["*", " ", "\n", "-", "<", ">", "ก", "a", "a", "a"]
+    for _ in range(200):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 2000)))
+        assert _clean_streamed(text, rng, max_step=50) == clean_response_text(text), repr(text)
@@ -0,0 +1,121 @@
+# File: tests/test_single_flight.py
+#
+# รัน: python -m pytest tests/test_single_flight.py
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from modules.single_flight import SingleFlight, last_model_turn_before, make_advisor_key
+
+DAILY_CONTEXT = {"full_date": "2026-10-19", "current_time": "12:00"}
+
+
+def _create_history(db_path, turns):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE conversation_history ( id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp DATETIME NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, reply_to INTEGER )")
+    conn.commit()
+    conn.close()
+    for role, content in turns:
+        _insert(db_path, role, content)
+
+
+def _insert(db_path, role, content):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.execute(
+        "INSERT INTO conversation_history (timestamp, role, content) VALUES (datetime('now'), ?, ?)", (role, content)
+    )
+    conn.commit()
+    conn.close()
+    return cursor.lastrowid
+
+
+def _key_for(db_path, query, user_row_id):
+    return make_advisor_key(query, last_model_turn_before(user_row_id, db_path=db_path), DAILY_CONTEXT)
+
+
+@pytest.mark.parametrize("history_turns", [2, 40])
+def test_identical_concurrent_requests_share_key(tmp_path, history_turns):
+    db_path = str(tmp_path / "memory.db")
+    _create_history(db_path, [(role, f"{role} {i}") for i in range(history_turns // 2) for role in ("user", "model")])
+
+    # ทั้งสองคำขอบันทึกคำถามของตัวเองก่อนสร้าง key (แบบเดียวกับ /ask)
+    first_row = _insert(db_path, "user", "แนะนำหนังสือการลงทุน")
+    second_row = _insert(db_path, "user", "  แนะนำหนังสือการลงทุน ")
+    assert _key_for(db_path, "แนะนำหนังสือการลงทุน", first_row) == _key_for(db_path, "  แนะนำหนังสือการลงทุน ", second_row)
+
+
+def test_key_changes_with_conversation_and_query(tmp_path):
+    db_path = str(tmp_path / "memory.db")
+    _create_history(db_path, [("user", "สวัสดี"), ("model", "สวัสดีครับ")])
+    first_row = _insert(db_path, "user", "ถามต่อ")
+    first_key = _key_for(db_path, "ถามต่อ", first_row)
+
+    _insert(db_path, "model", "คำตอบก่อนหน้า")
+    second_row = _insert(db_path, "user", "ถามต่อ")
+    assert _key_for(db_path, "ถามต่อ", second_row) != first_key
+    assert _key_for(db_path, "คำถามอื่น", first_row) != first_key
+
+
+def test_last_model_turn_before_without_history(tmp_path):
+    db_path = str(tmp_path / "memory.db")
+    _create_history(db_path, [("user", "คำถามแรก")])
+    assert last_model_turn_before(None, db_path=db_path) is None
+    assert last_model_turn_before(2, db_path=db_path) is None
+
+
+def test_concurrent_calls_run_work_once():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+        return results, flight.inflight
+
+    results, inflight = asyncio.run(main())
+    assert results == ["answer"] * 5
+    assert calls == 1
+    assert inflight == 0
+
+
+def test_exception_reaches_every_caller():
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        flight = SingleFlight("test")
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_follower_takes_over_when_leader_is_cancelled():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    async def main():
+        flight = SingleFlight("test")
+        leader = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == 2
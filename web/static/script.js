@@ -12,6 +12,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- 2. State Management ---
     let chatHistory = [];
+    let historyCursor = null; // id ของข้อความล่าสุดที่มีใน chatHistory (server ส่งมาเฉพาะข้อความหลังจากนี้)
     let isAudioUnlocked = false; 
     let isFengThinking = false;
     let availableVoices = [];
@@ -121,7 +122,8 @@ document.addEventListener('DOMContentLoaded', () => {
         const data = await getFengResponseFromAPI(currentQuery);
 
         if (data && data.answer) {
-            chatHistory = data.history;
+            appendHistory(data.history, data.cursor);
+            if (data.has_more) await catchUpHistory();
             //!! แก้ไข: ส่งทั้งข้อความและข้อมูลรูปภาพไปที่ addMessageToLog
             addMessageToLog(data.answer, 'feng', data.image); 
             playFengsVoice(data.answer);
@@ -129,6 +131,37 @@ document.addEventListener('DOMContentLoaded', () => {
         setThinkingState(false);
     };
     
+    /**
+     * ต่อท้ายเฉพาะข้อความใหม่ที่ server ส่งมา แทนการแทนที่ประวัติทั้งหมด
+     */
+    const appendHistory = (newTurns, cursor) => {
+        if (newTurns && newTurns.length) {
+            chatHistory.push(...newTurns);
+        }
+        if (cursor !== undefined && cursor !== null) {
+            historyCursor = cursor;
+        }
+    };
+
+    /**
+     * ดึงข้อความที่ยังขาดหลัง cursor จาก /history?after= จนครบ (เมื่อ /ask ตอบ has_more)
+     */
+    const catchUpHistory = async () => {
+        try {
+            let hasMore = true;
+            while (hasMore && historyCursor !== null) {
+                const response = await fetch(`/history?after=${historyCursor}&limit=100`);
+                if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+                const page = await response.json();
+                if (!page.turns.length) break;
+                appendHistory(page.turns, page.turns[page.turns.length - 1].id);
+                hasMore = page.has_more;
+            }
+        } catch (error) {
+            console.error('เกิดข้อผิดพลาดในการดึงประวัติเพิ่มเติม:', error);
+        }
+    };
+
     /**
      * ฟังก์ชันสำหรับเพิ่มข้อความและรูปภาพลงใน Chat Log (อัปเกรด)
      */
@@ -181,7 +214,7 @@ document.addEventListener('DOMContentLoaded', () => {
             const response = await fetch(apiUrl, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ query: userQuery }) // ส่งแค่ query
+                body: JSON.stringify({ query: userQuery, cursor: historyCursor }) // ส่ง query + cursor ของประวัติที่มีอยู่แล้ว
             });
 
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
@@ -190,9 +223,9 @@ document.addEventListener('DOMContentLoaded', () => {
         } catch (error) {
             console.error('เกิดข้อผิดพลาดในการเรียก API:', error);
             const errorMessage = 'ขออภัยครับ ดูเหมือนว่าจะมีปัญหาในการเชื่อมต่อกับระบบ';
-            // สร้าง history ปลอมสำหรับแสดงผลกรณี error
-            const fakeHistory = [...chatHistory, { "role": "user", "parts": userQuery }];
-            return { answer: errorMessage, history: fakeHistory, image: null };
+            // เพิ่มเฉพาะข้อความของผู้ใช้ลงประวัติกรณี error (cursor เดิมยังใช้ได้)
+            const fakeTurns = [{ "role": "user", "parts": userQuery }];
+            return { answer: errorMessage, history: fakeTurns, cursor: historyCursor, image: null };
         }
     };
     
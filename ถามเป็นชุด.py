@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import argparse
+
+import requests
+
+
+def load_queries(path):
+    """อ่านคำถามจากไฟล์: บรรทัดละหนึ่งคำถาม หรือ .jsonl ที่มี field "query" """
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    queries.append(json.loads(line)["query"])
+                except (json.JSONDecodeError, KeyError):
+                    print(f"⚠️ ข้ามบรรทัด {line_number}: ไม่ใช่ JSON ที่มี field 'query'")
+                continue
+            queries.append(line)
+    return queries
+
+
+def ask_batch(url, queries, offset, out, max_concurrency=None, timeout=30):
+    """ส่งคำถามหนึ่งชุดไปที่ /ask/batch และเขียนผลลัพธ์ที่ stream กลับมาลงไฟล์ทันทีที่ได้รับ"""
+    payload = {"queries": queries}
+    if max_concurrency:
+        payload["max_concurrency"] = max_concurrency
+    received, failed = 0, 0
+    with requests.post(f"{url}/ask/batch", json=payload, stream=True, timeout=(timeout, None)) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            record = json.loads(line)
+            record["index"] += offset
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            received += 1
+            if record.get("error"):
+                failed += 1
+            print(f"  [{record['index'] + 1}] {'❌ ' + record['error'] if record.get('error') else '✅'} {record['query'][:60]}")
+    return received, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ส่งคำถามจำนวนมากไปที่ /ask/batch แล้วบันทึกคำตอบเป็น .jsonl")
+    parser.add_argument("input", help="ไฟล์คำถาม (บรรทัดละหนึ่งคำถาม หรือ .jsonl ที่มี field 'query')")
+    parser.add_argument("--output", default="batch_answers.jsonl")
+    parser.add_argument("--url", default=os.getenv("CONSULTANT_URL", "http://127.0.0.1:8000"))
+    parser.add_argument("--batch-size", type=int, default=200, help="จำนวนคำถามต่อหนึ่งคำขอ")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="จำนวนการเรียก LLM พร้อมกันสูงสุด")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"❌ ไม่พบไฟล์ '{args.input}'")
+        sys.exit(1)
+
+    queries = load_queries(args.input)
+    if not queries:
+        print("❌ ไม่มีคำถามในไฟล์, จบการทำงาน")
+        sys.exit(1)
+
+    print(f"\n--- ส่งคำถาม {len(queries)} ข้อไปที่ {args.url}/ask/batch ---")
+    total_received, total_failed = 0, 0
+    with open(args.output, "w", encoding="utf-8") as out:
+        for start in range(0, len(queries), args.batch_size):
+            batch = queries[start:start + args.batch_size]
+            print(f"\n📦 ชุดที่ {start // args.batch_size + 1}: คำถามที่ {start + 1}-{start + len(batch)}")
+            try:
+                received, failed = ask_batch(args.url, batch, start, out, args.max_concurrency)
+            except requests.RequestException as e:
+                print(f"❌ เชื่อมต่อ server ไม่สำเร็จ: {e}")
+                sys.exit(1)
+            total_received += received
+            total_failed += failed
+
+    print(f"\n✅ บันทึกคำตอบ {total_received} ข้อ (ผิดพลาด {total_failed} ข้อ) ลงใน '{args.output}' เรียบร้อยแล้ว")
@@ -3,98 +3,293 @@ import json
 import faiss
 import numpy as np
 import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from sentence_transformers import SentenceTransformer
 
-def load_data(data_folder):
-    texts = []
-    mapping = {}
-    idx = 0
+from modules.knowledge_store import KnowledgeStoreWriter, iter_jsonl_entries, MAPPING_JSONL, MAPPING_JSONL_BUILDING
+from modules.deduplicator import ChunkDeduplicator
 
-    if not os.path.exists(data_folder):
-        print(f"❌ โฟลเดอร์ '{data_folder}' ไม่พบ")
-        return texts, mapping
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+CHECKPOINT_FILE = "build_checkpoint.json"
+VECTORS_FILE = "vectors.f32"
+DEDUP_REPORT_FILE = "dedup_report.jsonl"
 
-    for filename in sorted(os.listdir(data_folder)):
-        if not filename.endswith(".jsonl"): continue
+def build_record(item):
+    content = item.get("content", "").strip()
+    if not content:
+        return None
 
-        path = os.path.join(data_folder, filename)
-        print(f"🔄 กำลังประมวลผลไฟล์: {filename}")
+    book = item.get("book_title", "ไม่ระบุ").strip()
+    category = item.get("category", "ไม่ระบุหมวดหมู่").strip()
+    chapter = item.get("chapter_title", "").strip()
+    title = item.get("title", "").strip()
+
+    context_parts = [f"จากหนังสือ '{book}'", f"หมวดหมู่ '{category}'"]
+    if chapter: context_parts.append(f"บทที่ว่าด้วย '{chapter}'")
+    if title: context_parts.append(f"หัวข้อ '{title}'")
+
+    embedding_text = ", ".join(context_parts) + f": {content}"
+    mapped_item = item.copy()
+    mapped_item['embedding_text'] = embedding_text
+    return embedding_text, mapped_item
+
+def parse_file(path):
+    """
+    อ่านไฟล์ .jsonl หนึ่งไฟล์ (ทำงานใน process pool)
+    คืนค่า (records, warnings) โดย records คือ list ของ (embedding_text, mapped_item)
+    """
+    filename = os.path.basename(path)
+    records, warnings = [], []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line_num, line in enumerate(f, 1):
+                if not line.strip(): continue
+                try:
+                    record = build_record(json.loads(line))
+                    if record:
+                        records.append(record)
+                    else:
+                        warnings.append(f"  ❗ ไฟล์ '{filename}' บรรทัดที่ {line_num}: ไม่พบ 'content' ที่จะใช้ได้")
+                except json.JSONDecodeError as e:
+                    warnings.append(f"  ❌ ไฟล์ '{filename}' บรรทัดที่ {line_num} อ่าน JSON ไม่ได้: {e}")
+    except Exception as e:
+        warnings.append(f"❌ ไม่สามารถเปิดหรืออ่านไฟล์ '{filename}' ได้: {e}")
+    return records, warnings
+
+# ==============================================================================
+# ตัวสร้าง Index แบบ Streaming (สำหรับคลังหนังสือขนาดใหญ่)
+# ==============================================================================
+
+def _write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _load_checkpoint(index_folder, files, model_name):
+    path = os.path.join(index_folder, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("files") != files or checkpoint.get("model_name") != model_name:
+        print("⚠️ ไฟล์ข้อมูลหรือโมเดลเปลี่ยนไปจาก checkpoint เดิม, เริ่มสร้างใหม่ทั้งหมด")
+        return None
+    return checkpoint
+
+class StreamingIndexBuilder:
+    """
+    สร้าง FAISS index ทีละ chunk: แยกไฟล์ด้วย process pool, encode ทีละ `chunk_size` ข้อความ,
+    เพิ่มเข้า index และต่อท้าย mapping.jsonl.tmp ไปเรื่อยๆ พร้อมบันทึก checkpoint เพื่อทำต่อได้เมื่อถูกขัดจังหวะ
+    (faiss.index และ mapping.jsonl ที่ใช้งานอยู่ถูกแทนที่พร้อมกันเมื่อสร้างเสร็จเท่านั้น)
+
+    Vector ที่ encode แล้วจะถูกต่อท้ายไฟล์ vectors.f32 ด้วย ทำให้การ resume ไม่ต้อง encode ซ้ำ
+    และไม่ต้องเขียน index ทั้งก้อนลงดิสก์ทุกครั้งที่ทำ checkpoint
+
+    ก่อน encode ข้อมูลทุกรายการจะผ่าน ChunkDeduplicator เพื่อตัดเนื้อหาที่ซ้ำหรือเกือบซ้ำทิ้ง
+    และบันทึกรายการที่ถูกรวมไว้ใน dedup_report.jsonl
+    """
+
+    def __init__(self, data_folder="data", index_folder="./index", model_name=MODEL_NAME,
+                 chunk_size=256, checkpoint_every=8, workers=None, dedup=True, near_threshold=0.85):
+        self.data_folder = data_folder
+        self.index_folder = index_folder
+        self.model_name = model_name
+        self.chunk_size = chunk_size
+        self.checkpoint_every = checkpoint_every
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.deduplicator = ChunkDeduplicator(near_threshold=near_threshold) if dedup else None
+        self.dedup_settings = {"enabled": dedup, "near_threshold": near_threshold if dedup else None}
+        self.dedup_counts = {"exact": 0, "near": 0}
+
+    def build(self, resume=True):
+        os.makedirs(self.index_folder, exist_ok=True)
+        files = sorted(f for f in os.listdir(self.data_folder) if f.endswith(".jsonl"))
+        if not files:
+            print(f"❌ ไม่พบไฟล์ .jsonl ในโฟลเดอร์ '{self.data_folder}'")
+            return 0
+
+        self.model = SentenceTransformer(self.model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.index = faiss.IndexFlatL2(self.dim)
+
+        checkpoint = _load_checkpoint(self.index_folder, files, self.model_name) if resume else None
+        if checkpoint and checkpoint.get("dedup", self.dedup_settings) != self.dedup_settings:
+            # ข้อมูลที่อยู่ใน index แล้วถูกกรองด้วยค่าเดิม การทำต่อด้วยค่าใหม่จะได้ index ที่ใช้สองนโยบายปนกัน
+            raise ValueError(
+                f"checkpoint เดิมสร้างด้วยการตั้งค่าตัดข้อมูลซ้ำ {checkpoint['dedup']} "
+                f"แต่ครั้งนี้ใช้ {self.dedup_settings}: ใช้ค่าเดิมเพื่อทำต่อ หรือใช้ --fresh เพื่อเริ่มใหม่"
+            )
+        vectors_path = os.path.join(self.index_folder, VECTORS_FILE)
+        if checkpoint:
+            self.next_id = checkpoint["next_id"]
+            start_file, start_record = checkpoint["file_pos"], checkpoint["record_pos"]
+            self._restore_vectors(vectors_path, self.next_id)
+            self.store = KnowledgeStoreWriter(self.index_folder, truncate_at=checkpoint["mapping_bytes"], filename=MAPPING_JSONL_BUILDING)
+            self.report = KnowledgeStoreWriter(self.index_folder, truncate_at=checkpoint.get("report_bytes", 0), filename=DEDUP_REPORT_FILE)
+            self._restore_deduplicator()
+            print(f"♻️ ทำต่อจาก checkpoint: มีข้อมูลแล้ว {self.next_id} รายการ")
+        else:
+            self.next_id, start_file, start_record = 0, 0, 0
+            self.store = KnowledgeStoreWriter(self.index_folder, filename=MAPPING_JSONL_BUILDING)
+            self.report = KnowledgeStoreWriter(self.index_folder, filename=DEDUP_REPORT_FILE)
+        self.vectors = open(vectors_path, "r+b" if checkpoint else "wb")
+        self.vectors.truncate(self.next_id * self.dim * 4)
+        self.vectors.seek(0, os.SEEK_END)
+
+        self.files = files
+        self._pending = []
+        self._chunks_since_checkpoint = 0
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                for line_num, line in enumerate(f, 1):
-                    if not line.strip(): continue
-                    
-                    try:
-                        item = json.loads(line)
-                        content = item.get("content", "").strip()
-
-                        if content:
-                            book = item.get("book_title", "ไม่ระบุ").strip()
-                            category = item.get("category", "ไม่ระบุหมวดหมู่").strip()
-                            chapter = item.get("chapter_title", "").strip()
-                            title = item.get("title", "").strip()
-                            
-                            context_parts = [f"จากหนังสือ '{book}'", f"หมวดหมู่ '{category}'"]
-                            if chapter: context_parts.append(f"บทที่ว่าด้วย '{chapter}'")
-                            if title: context_parts.append(f"หัวข้อ '{title}'")
-                            
-                            embedding_text = ", ".join(context_parts) + f": {content}"
-                            
-                            texts.append(embedding_text)
-                            
-                            mapped_item = item.copy()
-                            mapped_item['embedding_text'] = embedding_text
-                            mapping[str(idx)] = mapped_item
-                            idx += 1
-                        else:
-                            print(f"  ❗ ไฟล์ '{filename}' บรรทัดที่ {line_num}: ไม่พบ 'content' ที่จะใช้ได้")
-
-                    except json.JSONDecodeError as e:
-                        print(f"  ❌ ไฟล์ '{filename}' บรรทัดที่ {line_num} อ่าน JSON ไม่ได้: {e}")
-        except Exception as e:
-            print(f"❌ ไม่สามารถเปิดหรืออ่านไฟล์ '{filename}' ได้: {e}")
-
-    return texts, mapping
-
-def create_faiss_index(texts, model_name="paraphrase-multilingual-MiniLM-L12-v2"):
-    model = SentenceTransformer(model_name)
-    print("\n⏳ กำลังสร้าง Embeddings จากข้อความทั้งหมด (อาจใช้เวลาสักครู่)...")
-    embeddings = model.encode(texts, convert_to_numpy=True, show_progress_bar=True).astype("float32")
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-    return index
-
-def save_index_and_mapping(index, mapping, index_folder="./index"):
-    os.makedirs(index_folder, exist_ok=True)
-    faiss_path = os.path.join(index_folder, "faiss.index")
-    mapping_path = os.path.join(index_folder, "mapping.json")
-    print(f"\n💾 กำลังบันทึก Index ไปที่ '{faiss_path}'...")
-    faiss.write_index(index, faiss_path)
-    print(f"💾 กำลังบันทึก Mapping ไปที่ '{mapping_path}'...")
-    with open(mapping_path, "w", encoding="utf-8") as f:
-        json.dump(mapping, f, ensure_ascii=False, indent=2)
+            for file_pos, records in self._parsed_files(start_file):
+                skip = start_record if file_pos == start_file else 0
+                for record_pos, (embedding_text, mapped_item) in enumerate(records):
+                    if record_pos < skip: continue
+                    if self._is_duplicate(mapped_item, file_pos): continue
+                    self._pending.append((embedding_text, mapped_item, file_pos, record_pos))
+                    if len(self._pending) >= self.chunk_size:
+                        self._flush_chunk()
+            self._flush_chunk()
+            self._checkpoint()
+        finally:
+            self.store.close()
+            self.report.close()
+            self.vectors.close()
+
+        if self.deduplicator:
+            print(f"🧹 ตัดข้อมูลซ้ำแบบตรงตัว {self.dedup_counts['exact']} รายการ, เกือบซ้ำ {self.dedup_counts['near']} รายการ (ดูรายละเอียดใน {DEDUP_REPORT_FILE})")
+
+        if not self.next_id:
+            os.remove(vectors_path)
+            os.remove(self.store.path)
+            return 0
+        self._finalize(vectors_path)
+        return self.next_id
+
+    def _parsed_files(self, start_file):
+        """ส่งไฟล์เข้า process pool แบบ sliding window เพื่อไม่ให้ผลลัพธ์ค้างอยู่ในหน่วยความจำเกินจำเป็น"""
+        window = self.workers * 2
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {}
+            next_submit = start_file
+            for file_pos in range(start_file, len(self.files)):
+                while next_submit < len(self.files) and next_submit - file_pos < window:
+                    path = os.path.join(self.data_folder, self.files[next_submit])
+                    futures[next_submit] = pool.submit(parse_file, path)
+                    next_submit += 1
+                records, warnings = futures.pop(file_pos).result()
+                print(f"🔄 กำลังประมวลผลไฟล์: {self.files[file_pos]} ({len(records)} รายการ)")
+                for warning in warnings: print(warning)
+                yield file_pos, records
+
+    def _restore_deduplicator(self):
+        if not self.deduplicator: return
+        for entry_id, entry in iter_jsonl_entries(self.store.path):
+            self.deduplicator.register(int(entry_id), entry.get("content", ""))
+
+    def _is_duplicate(self, mapped_item, file_pos):
+        if not self.deduplicator: return False
+        content = mapped_item.get("content", "")
+        duplicate = self.deduplicator.check(content)
+        if duplicate:
+            kind, kept_id, similarity = duplicate
+            self.dedup_counts[kind] += 1
+            self.report.append({
+                "kind": kind,
+                "similarity": round(similarity, 4),
+                "kept_id": kept_id,
+                "dropped": {
+                    "file": self.files[file_pos],
+                    "book_title": mapped_item.get("book_title", "ไม่ระบุ"),
+                    "title": mapped_item.get("title", ""),
+                },
+            })
+            return True
+        self.deduplicator.register(self.next_id + len(self._pending), content)
+        return False
+
+    def _restore_vectors(self, vectors_path, count):
+        vectors = np.memmap(vectors_path, dtype="float32", mode="r", shape=(count, self.dim)) if count else None
+        for start in range(0, count, self.chunk_size * self.checkpoint_every):
+            self.index.add(np.ascontiguousarray(vectors[start:start + self.chunk_size * self.checkpoint_every]))
+        del vectors
+
+    def _flush_chunk(self):
+        if not self._pending: return
+        texts = [text for text, _, _, _ in self._pending]
+        embeddings = self.model.encode(texts, batch_size=min(self.chunk_size, 128), convert_to_numpy=True).astype("float32")
+        self.index.add(embeddings)
+        self.vectors.write(embeddings.tobytes())
+        for _, mapped_item, _, _ in self._pending:
+            self.store.append(mapped_item)
+        self.next_id += len(self._pending)
+        _, _, file_pos, record_pos = self._pending[-1]
+        self._position = (file_pos, record_pos + 1)
+        self._pending = []
+
+        self._chunks_since_checkpoint += 1
+        if self._chunks_since_checkpoint >= self.checkpoint_every:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        if not hasattr(self, "_position"): return
+        self.vectors.flush()
+        os.fsync(self.vectors.fileno())
+        mapping_bytes = self.store.flush()
+        report_bytes = self.report.flush()
+        _write_json_atomic(os.path.join(self.index_folder, CHECKPOINT_FILE), {
+            "model_name": self.model_name,
+            "files": self.files,
+            "file_pos": self._position[0],
+            "record_pos": self._position[1],
+            "next_id": self.next_id,
+            "dedup": self.dedup_settings,
+            "mapping_bytes": mapping_bytes,
+            "report_bytes": report_bytes,
+        })
+        self._chunks_since_checkpoint = 0
+        print(f"  💾 checkpoint: {self.next_id} รายการ")
+
+    def _finalize(self, vectors_path):
+        faiss_path = os.path.join(self.index_folder, "faiss.index")
+        print(f"\n💾 กำลังบันทึก Index ไปที่ '{faiss_path}'...")
+        faiss.write_index(self.index, faiss_path + ".tmp")
+        # mapping.jsonl เดิมยังใช้งานได้ตลอดการสร้าง และถูกสลับพร้อมกับ faiss.index เท่านั้น
+        # เพื่อไม่ให้ server ที่เริ่มระหว่างสร้าง (หรือหลังสร้างค้างไว้) จับคู่ index เก่ากับ mapping ที่ยังไม่ครบ
+        os.replace(faiss_path + ".tmp", faiss_path)
+        os.replace(self.store.path, os.path.join(self.index_folder, MAPPING_JSONL))
+        os.remove(vectors_path)
+        os.remove(os.path.join(self.index_folder, CHECKPOINT_FILE))
 
 if __name__ == "__main__":
-    data_folder = "data"
-    index_output_folder = "./index"
-    
-    if not os.path.exists(data_folder):
-        print(f"❌ โฟลเดอร์ '{data_folder}' ไม่พบ")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="สร้าง FAISS index จากไฟล์ .jsonl ในโฟลเดอร์ data")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--index", default="./index")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--fresh", action="store_true", help="ไม่ใช้ checkpoint เดิม เริ่มสร้างใหม่ทั้งหมด")
+    parser.add_argument("--no-dedup", action="store_true", help="ไม่ตัดข้อมูลที่ซ้ำกันออก")
+    parser.add_argument("--near-threshold", type=float, default=0.85, help="ค่าความคล้าย (Jaccard) ที่ถือว่าเกือบซ้ำ")
+    args = parser.parse_args()
 
-    if not os.path.exists(index_output_folder):
-        os.makedirs(index_output_folder)
-        print(f"📁 สร้างโฟลเดอร์ '{index_output_folder}' แล้ว")
+    if not os.path.exists(args.data):
+        print(f"❌ โฟลเดอร์ '{args.data}' ไม่พบ")
+        sys.exit(1)
 
     print("\n--- เริ่มกระบวนการสร้าง Index ---")
-    texts, mapping = load_data(data_folder)
+    builder = StreamingIndexBuilder(args.data, args.index, chunk_size=args.chunk_size, workers=args.workers,
+                                    dedup=not args.no_dedup, near_threshold=args.near_threshold)
+    try:
+        total = builder.build(resume=not args.fresh)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
 
-    if not texts:
+    if not total:
         print("❌ ไม่มีข้อความที่ถูกต้องให้สร้าง Index ได้, จบการทำงาน")
         sys.exit(1)
 
-    print(f"\n📦 พบข้อความสำหรับสร้าง Index ทั้งหมด: {len(texts)} รายการ")
-    index = create_faiss_index(texts)
-    save_index_and_mapping(index, mapping)
-    print(f"\n✅ สร้าง faiss.index และ mapping.json ใหม่เรียบร้อยแล้ว!")
\ No newline at end of file
+    print(f"\n✅ สร้าง faiss.index และ mapping.jsonl ใหม่เรียบร้อยแล้ว! ({total} รายการ)")